@@ -1,19 +1,22 @@
 import datetime as dt
+import math
+import time
 from datetime import timezone
 import pandas as pd
 import streamlit as st
 from zoneinfo import ZoneInfo
-from fm_api import list_objects, list_geozones, find_trips
-from transforms import parse_iso, trips_to_zone_pairs, format_address, geozones_for_point, merge_short_trips
-import math
-
-
-def round_nearest_int(x: float | int | None) -> int:
-    if x is None:
-        return 0
-    return int(math.floor(float(x) + 0.5))
+from fm_api import list_objects
+from transforms import TripTable
+from geoutils import GeozoneIndex
+from geozone_cache import geozone_catalog
+from export import MIME_TYPES, available_formats, export_bytes
+from jobs import default_store
+from metrics import METRICS, Profiler, available_profilers, configure_from_env, incr, log_metrics, since, timed
+from report import (build_report, format_rows, format_totals, iter_report_rows, load_trip_tables, report_sums,
+                    report_totals)
 
 st.set_page_config(page_title="Logbook with geozones", page_icon="🗺️", layout="wide")
+configure_from_env()
 st.title("Logbook with geozones")
 
 # -------- Sidebar / settings ----------
@@ -64,6 +67,11 @@ with st.sidebar:
         value=False,
         help="If checked, distances keep 3 decimals. If unchecked, distances are rounded to nearest whole km."
     )
+    fleet_mode = st.checkbox(
+        "Fleet mode (several vehicles)",
+        value=False,
+        help="Run the report for several vehicles at once: one tab per vehicle plus fleet totals."
+    )
     short_trip_minutes = st.number_input(
         "Merge trips shorter than (minutes)",
         min_value=0, max_value=120, value=0, step=1,
@@ -76,6 +84,22 @@ with st.sidebar:
         help="If the pause between two trips is ≤ this value, they will be merged (e.g., border crossings)."
     )
 
+    page_size = st.selectbox(
+        "Rows per page",
+        options=[50, 100, 250, 500, 1000], index=1,
+        help="Only one page of the table is rendered at a time; totals always cover all rows."
+    )
+
+    # Filled in at the end of the script with the numbers of this run
+    perf_box = st.expander("Performance", expanded=False)
+    profile_run = perf_box.checkbox(
+        "Profile RUN",
+        value=False,
+        help="Profile each RUN: the background report job (fetching and zone classification; not the "
+             "fetch worker threads) and the page render."
+    )
+    profiler_kind = perf_box.selectbox("Profiler", options=available_profilers(), index=0) if profile_run else None
+
 # Build local datetimes, then convert to UTC for the API
 from_dt_local = dt.datetime.combine(from_date, from_time).replace(tzinfo=user_tz)
 to_dt_local   = dt.datetime.combine(to_date,   to_time).replace(tzinfo=user_tz)
@@ -83,11 +107,16 @@ from_dt = from_dt_local.astimezone(timezone.utc)
 to_dt   = to_dt_local.astimezone(timezone.utc)
 
 # --- Load lists after API key is entered ---
-if api_key and (not st.session_state.get("objects") or not st.session_state.get("geozones")):
+if api_key:
     try:
-        st.session_state.objects = list_objects(api_key)
-        st.session_state.geozones = list_geozones(api_key)
-        st.sidebar.success("Objects and geozones loaded ✅")
+        first_load = not st.session_state.get("objects")
+        if first_load:
+            st.session_state.objects = list_objects(api_key)
+        # Geozones come from the process-wide catalog cache (shared by all sessions, TTL-revalidated)
+        geozone_cat = geozone_catalog(api_key)
+        st.session_state.geozones = geozone_cat.zones
+        if first_load:
+            st.sidebar.success("Objects and geozones loaded ✅")
     except Exception as e:
         st.sidebar.error(f"Loading error: {e}")
         st.stop()
@@ -104,17 +133,20 @@ col1, col2 = st.columns([1, 2], vertical_alignment="bottom")
 
 with col1:
     options = {o["name"]: o["id"] for o in st.session_state.objects}
-    vehicle_name = st.selectbox("Select Vehicle", options=list(options.keys()))
-    vehicle_id = options[vehicle_name]
-
-    # If the user switched to a new vehicle → request date reset and trigger rerun
-    if st.session_state.get("last_vehicle") != vehicle_id:
-        st.session_state["last_vehicle"] = vehicle_id
-        st.session_state["reset_dates_to_today"] = True
-        st.rerun()
+    if fleet_mode:
+        fleet_names = st.multiselect("Select Vehicles", options=list(options.keys()), key="fleet_vehicles")
+    else:
+        vehicle_name = st.selectbox("Select Vehicle", options=list(options.keys()))
+        vehicle_id = options[vehicle_name]
+
+        # If the user switched to a new vehicle → request date reset and trigger rerun
+        if st.session_state.get("last_vehicle") != vehicle_id:
+            st.session_state["last_vehicle"] = vehicle_id
+            st.session_state["reset_dates_to_today"] = True
+            st.rerun()
 
 with col2:
-    all_zone_names = [g["name"] for g in st.session_state.geozones]
+    all_zone_names = [z.name for z in st.session_state.geozones]
     excluded_zone_names = st.multiselect(
         "Exclude geozones (optional)",
         options=sorted(all_zone_names),
@@ -122,192 +154,267 @@ with col2:
         help="The selected geozones will not be considered when checking whether a point falls inside a zone."
     )
 
-def get_filtered_geozones():
+def get_geozone_index() -> GeozoneIndex:
+    # The catalog already carries the index for the unfiltered list
+    base = geozone_cat.index
     if not excluded_zone_names:
-        return st.session_state.geozones
-    return [g for g in st.session_state.geozones if g.get("name") not in set(excluded_zone_names)]
+        return base
+    # Exclusions are a mask over that index, made once per selection; compiled geometry,
+    # grid and memoized point->zone results stay shared across selections
+    key = (base.version, tuple(sorted(excluded_zone_names)))
+    if st.session_state.get("geozone_index_key") != key:
+        st.session_state["geozone_index"] = base.excluding(excluded_zone_names)
+        st.session_state["geozone_index_key"] = key
+    return st.session_state["geozone_index"]
 
 
 st.session_state["short_trip_minutes"] = short_trip_minutes
 
 
-# --- RUN button ---
-if st.button("▶️ RUN"):
+TABLE_CSS = """
+<style>
+.tbl { width: 100%; border-collapse: collapse; font-size: 0.95rem; table-layout: fixed; }
+.tbl th, .tbl td { border: 1px solid #e5e7eb; padding: 8px 10px; vertical-align: top; }
+.tbl thead th { background: #f8fafc; text-align: left; }
+.tbl td { line-height: 1.25; word-wrap: break-word; overflow-wrap: anywhere; }
+.tbl td:nth-child(1), .tbl td:nth-child(3) { min-width: 280px; }
+</style>
+""".strip()
+
+
+def render_report(df_report, key: str) -> None:
+    """Report table plus totals bar (MODE 1 zone-to-zone segments, MODE 2 all trips)."""
+    if df_report.empty:
+        st.info("No trips found for the selected period.")
+        return
+
+    # Only the visible page is turned into HTML; the totals below still cover every row
+    n_rows = len(df_report)
+    n_pages = max(1, math.ceil(n_rows / page_size))
+    page = 1
+    if n_pages > 1:
+        page_key = f"page_{key}"
+        # keep a remembered page valid when the data shrinks (e.g. other merge thresholds)
+        if st.session_state.get(page_key, 1) > n_pages:
+            st.session_state[page_key] = n_pages
+        pager_col, info_col = st.columns([1, 3], vertical_alignment="bottom")
+        page = int(pager_col.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, step=1, key=page_key))
+        first = (page - 1) * page_size
+        info_col.caption(f"Rows {first + 1}–{min(first + page_size, n_rows)} of {n_rows}")
+    first = (page - 1) * page_size
+    # Records stay numeric; only the visible page is formatted into display strings
+    visible = format_rows(df_report.iloc[first:first + page_size], user_tz)
+    with timed("app.to_html"):
+        table_html = visible.to_html(escape=False, index=False, border=0, classes="tbl").lstrip()
+    incr("app.rows_rendered", len(visible))
+
+    totals = report_totals(df_report, raw_mode)
+    summary_html = f"""
+    <div class="totals">Totals — Distance: <b>{totals["distance"]} km</b> · Travel time: <b>{totals["travel"]}</b> · Stop time: <b>{totals["stay"]}</b></div>
+    <style>.totals{{margin-top:6px;}}</style>
+    """
+
+    # >>> Single render block <<<
+    st.subheader("Trips-derived Logbook (zone-filtered pairs)" if merge_trips else "All Trips (detailed view)")
+    st.markdown(TABLE_CSS, unsafe_allow_html=True)
+    st.markdown(table_html, unsafe_allow_html=True)
+    st.markdown(summary_html, unsafe_allow_html=True)
+
+
+def show_report(base_table: TripTable, label: str, key: str):
+    """Merge, render and offer downloads for one vehicle; returns the displayed report."""
+    short_minutes = int(st.session_state.get("short_trip_minutes", 3))  # 0 = disabled
+    trip_table = base_table.merge_short(min_minutes=short_minutes, max_gap_minutes=int(stay_gap_minutes))
+    geozone_index = get_geozone_index()
+    df_report = build_report(trip_table, geozone_index, merge_trips, raw_mode)
+    render_report(df_report, key)
+    if df_report.empty:
+        return df_report
+
+    # Files are generated only when a button is clicked, streamed from the pipeline (no DataFrame/HTML)
+    settings = (merge_trips, raw_mode, user_tz)
+    stem = f"logbook_{label}_{from_date}_{to_date}".replace(" ", "_")
+    fmts = available_formats()
+    for col, fmt in zip(st.columns(len(fmts) + 2)[:len(fmts)], fmts):
+        def make_file(fmt=fmt) -> bytes:
+            return export_bytes(iter_report_rows(trip_table, geozone_index, *settings, html=False), fmt)
+        col.download_button(f"⬇️ {fmt.upper()}", data=make_file, file_name=f"{stem}.{fmt}",
+                            mime=MIME_TYPES[fmt], on_click="ignore", key=f"download_{fmt}_{key}")
+    return df_report
+
+
+# --- RUN button: each RUN becomes a background job; reruns only look it up ---
+jobs = default_store()
+run_clicked = st.button("▶️ RUN")
+if run_clicked:
     st.session_state["report_ready"] = True
-
-# --- Generate report if ready ---
-if st.session_state.get("report_ready"):
-    try:
-        st.markdown(f"### Vehicle: {vehicle_name}")
-
-        trips = find_trips(api_key, from_dt, to_dt, vehicle_id)
-
-        short_trip_minutes = int(st.session_state.get("short_trip_minutes", 3))  # 0 = disabled
-        trips = merge_short_trips(
-            trips,
-            min_minutes=int(short_trip_minutes),
-            max_gap_minutes=int(stay_gap_minutes),
-        )
-
-        filtered_geozones = get_filtered_geozones()
-
-        # Shared helper function
-        def fmt_hms(total_seconds: int | float | None) -> str:
-            s = int(total_seconds or 0)
-            h = s // 3600
-            m = (s % 3600) // 60
-            sec = s % 60
-            return f"{h:02d}:{m:02d}:{sec:02d}"
-
-        def parse_hms(hms: str | None) -> int:
-            """'HH:MM:SS' → total seconds. Empty or None → 0."""
-            if not hms or not isinstance(hms, str):
-                return 0
-            try:
-                h, m, s = hms.split(":")
-                return int(h) * 3600 + int(m) * 60 + int(s)
-            except Exception:
-                return 0
-
-        # ================================
-        # MODE 1 — Merge trips by geozones
-        # ================================
-        if merge_trips:
-            trip_pairs = trips_to_zone_pairs(trips, filtered_geozones)
-            df_log = pd.DataFrame(trip_pairs)
-
-            if not df_log.empty:
-                # Local time formatting
-                for col in ["Departure at", "Arrival at"]:
-                    df_log[col] = df_log[col].apply(
-                        lambda x: x.astimezone(user_tz).strftime("%Y-%m-%d %H:%M:%S")
-                        if isinstance(x, dt.datetime) else ""
-                    )
-
-                # Rounding if not in raw mode
-                if "Distance (km)" in df_log.columns and not raw_mode:
-                    df_log["Distance (km)"] = df_log["Distance (km)"].apply(
-                        lambda x: round_nearest_int(float(x)) if x not in (None, "") else 0
-                    )
-
-                css = """
-                <style>
-                .tbl { width: 100%; border-collapse: collapse; font-size: 0.95rem; table-layout: fixed; }
-                .tbl th, .tbl td { border: 1px solid #e5e7eb; padding: 8px 10px; vertical-align: top; }
-                .tbl thead th { background: #f8fafc; text-align: left; }
-                .tbl td { line-height: 1.25; word-wrap: break-word; overflow-wrap: anywhere; }
-                .tbl td:nth-child(1), .tbl td:nth-child(3) { min-width: 280px; }
-                </style>
-                """.strip()
-
-                table_html = df_log.to_html(escape=False, index=False, border=0, classes="tbl").lstrip()
-
-                # --- Totals (aggregated view) ---
-                total_distance_val = float(pd.to_numeric(df_log["Distance (km)"], errors="coerce").fillna(0).sum())
-                total_distance_str = f"{total_distance_val:.3f}" if raw_mode else f"{round_nearest_int(total_distance_val)}"
-                total_travel_s = int(df_log["Duration"].fillna("").map(parse_hms).sum())
-                total_stay_s = int(df_log["Stay (hh:mm:ss)"].fillna("").map(parse_hms).sum())
-
-                summary_html = f"""
-                <div class="totals">Totals — Distance: <b>{total_distance_str} km</b> · Travel time: <b>{fmt_hms(total_travel_s)}</b> · Stop time: <b>{fmt_hms(total_stay_s)}</b></div>
-                <style>.totals{{margin-top:6px;}}</style>
-                """
-
-                # >>> Single render block <<<
-                st.subheader("Trips-derived Logbook (zone-filtered pairs)")
-                st.markdown(css, unsafe_allow_html=True)
-                st.markdown(table_html, unsafe_allow_html=True)
-                st.markdown(summary_html, unsafe_allow_html=True)
+    run_vehicles = [(options[name], name) for name in fleet_names] if fleet_mode else [(vehicle_id, vehicle_name)]
+    if run_vehicles:
+        params = {"vehicles": tuple(run_vehicles), "from_dt": from_dt, "to_dt": to_dt, "fleet": fleet_mode}
+        # The same report still in progress is attached to rather than queued twice
+        job = next((j for j in jobs.jobs(st.session_state.get("job_ids", []))
+                    if not j.finished and j.params == params), None)
+        if job is None:
+            label = run_vehicles[0][1] if not fleet_mode else f"Fleet of {len(run_vehicles)}"
+            job = jobs.submit(f"{label}, {from_date} – {to_date}", load_trip_tables, api_key,
+                              [vid for vid, _ in run_vehicles], from_dt, to_dt, get_geozone_index(), params=params,
+                              profile=profiler_kind)
+            st.session_state.setdefault("job_ids", []).append(job.id)
+            # Short reports are usually done within a moment: show them in this run, not after a poll
+            job.wait(timeout=1.0)
+        st.session_state["active_job"] = job.id
+    for k in [k for k in st.session_state if str(k).startswith("page_")]:
+        del st.session_state[k]
+
+
+def describe_job(job) -> str:
+    p = job.snapshot()["progress"]
+    text = f"{job.label} · {job.status}"
+    if p.get("vehicles", 0) > 1:
+        text += f" · {p.get('vehicles_done', 0)}/{p['vehicles']} vehicles"
+    if p.get("pages"):
+        text += f" · {p['pages']} pages, {p.get('trips', 0)} trips fetched"
+    return text
+
+
+# --- Queued and finished reports of this session ---
+session_jobs = jobs.jobs(st.session_state.get("job_ids", []))
+st.session_state["job_ids"] = [j.id for j in session_jobs]
+if len(session_jobs) > 1:
+    ids = [j.id for j in reversed(session_jobs)]
+    if st.session_state.get("active_job") not in ids:
+        st.session_state["active_job"] = ids[0]
+    # Option labels stay fixed while jobs progress, so the selection is kept across polls
+    st.selectbox("Report", options=ids, format_func=lambda i: jobs.get(i).label, key="active_job",
+                 help="Reports keep running in the background; pick one to show it.")
+    with st.expander(f"Report jobs ({sum(not j.finished for j in session_jobs)} running)"):
+        for j in reversed(session_jobs):
+            st.caption(describe_job(j))
+active_job = jobs.get(st.session_state.get("active_job"))
+
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id: str, shown: int) -> None:
+    """Polls a running job; reruns the page when it finishes or another vehicle is ready."""
+    job = jobs.get(job_id)
+    if job is None:
+        return
+    snap = job.snapshot()
+    p = snap["progress"]
+    n, done = p.get("vehicles", 0), p.get("vehicles_done", 0)
+    if job.finished or len(snap["partial"]) != shown:
+        st.rerun()
+    status_col, cancel_col = st.columns([4, 1], vertical_alignment="center")
+    status_col.progress(done / n if n else 0.0,
+                        text=f"{job.status.capitalize()} · {p.get('pages', 0)} pages, {p.get('trips', 0)} trips fetched"
+                             + (f" · {done}/{n} vehicles" if n > 1 else "") + f" · {snap['elapsed_s']:.0f} s")
+    if cancel_col.button("Cancel", key=f"cancel_{job_id}"):
+        job.cancel()
+
+
+def fleet_totals_row(vehicle_sums) -> dict:
+    totals = format_totals(*vehicle_sums, raw_mode)
+    return {"Distance (km)": totals["distance"], "Travel time": totals["travel"], "Stop time": totals["stay"]}
+
+
+def show_fleet(job, results: dict) -> None:
+    fleet = list(job.params["vehicles"])
+    st.markdown(f"### Fleet: {len(fleet)} vehicles")
+    totals_slot = st.empty()
+    sums = {}
+    for (vid, name), tab in zip(fleet, st.tabs([name for _, name in fleet])):
+        with tab:
+            result = results.get(vid)
+            if result is None:
+                st.info(f"Loading {name}…")
+            elif isinstance(result, Exception):
+                st.error(f"Error: {result}")
             else:
-                st.info("No trips found for the selected period.")
-
-        # ================================
-        # MODE 2 — Show all trips (default)
-        # ================================
-        else:
-            rows = []
-            for i, t in enumerate(trips):
-                start = t.get("trip_start", {}) or {}
-                end = t.get("trip_end", {}) or {}
-
-                s_lat, s_lon = start.get("latitude"), start.get("longitude")
-                e_lat, e_lon = end.get("latitude"), end.get("longitude")
-
-                start_zones = geozones_for_point(s_lat, s_lon, filtered_geozones)
-                end_zones = geozones_for_point(e_lat, e_lon, filtered_geozones)
-
-                start_address = format_address(start.get("address"))
-                end_address = format_address(end.get("address"))
-
-                # If inside a geozone, highlight in red
-                if start_zones:
-                    start_address = f"<b style='color:red'>{', '.join(start_zones)}</b> : {start_address}"
-                if end_zones:
-                    end_address = f"<b style='color:red'>{', '.join(end_zones)}</b> : {end_address}"
-
-                # Compute stay time
-                stay = ""
-                if i + 1 < len(trips):
-                    next_trip = trips[i + 1]
-                    cur_end = parse_iso(end.get("datetime"))
-                    next_start = parse_iso(next_trip.get("trip_start", {}).get("datetime"))
-                    if cur_end and next_start:
-                        delta = (next_start - cur_end).total_seconds()
-                        if delta > 0:
-                            stay = fmt_hms(delta)
-
-                base_km = (t.get("mileage") or 0) / 1000.0
-                distance_value = (round(base_km, 3) if raw_mode else round_nearest_int(base_km))
-
-                rows.append({
-                    "Departure": start_address,
-                    "Departure at": parse_iso(start.get("datetime")),
-                    "Arrival": end_address,
-                    "Arrival at": parse_iso(end.get("datetime")),
-                    "Distance (km)": distance_value,
-                    "Duration": fmt_hms(t.get("trip_duration")),
-                    "Stay (hh:mm:ss)": stay,
-                })
-
-            df_trips = pd.DataFrame(rows)
-            if not df_trips.empty:
-                for col in ["Departure at", "Arrival at"]:
-                    df_trips[col] = df_trips[col].apply(
-                        lambda x: x.astimezone(user_tz).strftime("%Y-%m-%d %H:%M:%S") if isinstance(x,
-                                                                                                    dt.datetime) else ""
-                    )
-
-                css = """
-                <style>
-                .tbl { width: 100%; border-collapse: collapse; font-size: 0.95rem; table-layout: fixed; }
-                .tbl th, .tbl td { border: 1px solid #e5e7eb; padding: 8px 10px; vertical-align: top; }
-                .tbl thead th { background: #f8fafc; text-align: left; }
-                .tbl td { line-height: 1.25; word-wrap: break-word; overflow-wrap: anywhere; }
-                .tbl td:nth-child(1), .tbl td:nth-child(3) { min-width: 280px; }
-                </style>
-                """.strip()
-                table_html = df_trips.to_html(escape=False, index=False, border=0, classes="tbl").lstrip()
-
-                # --- Totals (detailed view) ---
-                # Distance: the table already contains rounded/raw values according to the checkbox
-                total_distance_val = float(pd.to_numeric(df_trips["Distance (km)"], errors="coerce").fillna(0).sum())
-                total_distance_str = f"{total_distance_val:.3f}" if raw_mode else f"{round_nearest_int(total_distance_val)}"
-
-                total_travel_s = int(df_trips["Duration"].fillna("").map(parse_hms).sum())
-                total_stay_s = int(df_trips["Stay (hh:mm:ss)"].fillna("").map(parse_hms).sum())
-
-                summary_html = f"""
-                <div class="totals">Totals — Distance: <b>{total_distance_str} km</b> · Travel time: <b>{fmt_hms(total_travel_s)}</b> · Stop time: <b>{fmt_hms(total_stay_s)}</b></div>
-                <style>.totals{{margin-top:6px;}}</style>
-                """
-
-                st.subheader("All Trips (detailed view)")
-                st.markdown(css, unsafe_allow_html=True)
-                st.markdown(table_html, unsafe_allow_html=True)
-                st.markdown(summary_html, unsafe_allow_html=True)  # <-- NEW: summary bar
+                # Endpoints were classified per vehicle in the job; the shared point->zone
+                # memo means depots common to the fleet are only tested once
+                sums[vid] = report_sums(show_report(result, name, key=f"fleet_{vid}"))
+    if sums:
+        agg = [{"Vehicle": name, **fleet_totals_row(sums[v])} for v, name in fleet if v in sums]
+        if len(agg) > 1:
+            agg.append({"Vehicle": "Fleet total", **fleet_totals_row(tuple(map(sum, zip(*sums.values()))))})
+        with totals_slot.container():
+            st.subheader(f"Fleet totals ({len(sums)}/{len(fleet)} vehicles)")
+            st.dataframe(pd.DataFrame(agg), hide_index=True)
+
+
+# --- Show the selected report ---
+metrics_before = METRICS.snapshot()
+run_started = time.perf_counter()
+profiler = Profiler(profiler_kind) if run_clicked and profiler_kind else None
+if profiler is not None:
+    try:
+        profiler.start()
+    except ValueError as e:  # another profiler is already active in this process
+        st.sidebar.warning(f"Profiling unavailable: {e}")
+        profiler = None
+
+if st.session_state.get("report_ready") and run_clicked and fleet_mode and not fleet_names:
+    st.info("Select one or more vehicles.")
+
+elif st.session_state.get("report_ready") and active_job is None and st.session_state.get("active_job"):
+    st.info("This report is no longer available; press RUN again.")
 
+elif st.session_state.get("report_ready") and active_job is not None:
+    try:
+        snap = active_job.snapshot()
+        if not active_job.finished:
+            job_progress(active_job.id, len(snap["partial"]))
+        if active_job.status == "failed":
+            st.error(f"Error: {active_job.error}")
+        elif active_job.status == "cancelled":
+            st.warning("Report cancelled.")
+        elif active_job.params["fleet"]:
+            show_fleet(active_job, snap["partial"])
+        elif active_job.finished:
+            # Threshold and display changes only redo the grouping on the job's sorted trip table
+            vid, name = active_job.params["vehicles"][0]
+            st.markdown(f"### Vehicle: {name}")
+            result = active_job.result[vid]
+            if isinstance(result, Exception):
+                st.error(f"Error: {result}")
             else:
-                st.info("No trips found for the selected period.")
+                show_report(result, name, key="vehicle")
 
     except Exception as e:
         st.error(f"Error: {e}")
+
+if profiler is not None:
+    st.session_state["last_profile"] = (profiler.kind, profiler.stop())
+
+# --- Performance expander: stage timings and counters of the report job and of this render ---
+def show_metrics(snap) -> None:
+    if snap["timers"]:
+        st.dataframe(pd.DataFrame([
+            {"Stage": name, "Calls": t["calls"], "Total ms": round(t["total_s"] * 1000, 1)}
+            for name, t in sorted(snap["timers"].items(), key=lambda kv: -kv[1]["total_s"])
+        ]), hide_index=True)
+    if snap["counters"]:
+        st.dataframe(pd.DataFrame([{"Counter": k, "Value": v} for k, v in sorted(snap["counters"].items())]),
+                     hide_index=True)
+
+
+if st.session_state.get("report_ready"):
+    run_metrics = since(metrics_before, METRICS.snapshot())
+    run_s = time.perf_counter() - run_started
+    log_metrics("report", run_metrics, run=bool(run_clicked), fleet=bool(fleet_mode), seconds=round(run_s, 3))
+    with perf_box:
+        if active_job is not None and active_job.metrics is not None:
+            # fetching, trip cache and zone classification happen in the job, not in this script run
+            st.caption(f"Report job: {active_job.snapshot()['elapsed_s'] * 1000:.0f} ms")
+            show_metrics(active_job.metrics)
+        st.caption(f"This run: {run_s * 1000:.0f} ms")
+        show_metrics(run_metrics)
+last_profile = st.session_state.get("last_profile")
+if profile_run and active_job is not None and active_job.profile is not None:
+    with perf_box:
+        st.caption(f"Report job profile ({active_job.profile[0]})")
+        st.code(active_job.profile[1], language=None)
+if last_profile and profile_run:
+    with perf_box:
+        st.caption(f"Last RUN render profile ({last_profile[0]})")
+        st.code(last_profile[1], language=None)
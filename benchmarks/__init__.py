@@ -0,0 +1 @@
+"""Benchmark harness (not tests): synthetic fleets, geozones and a local FM API stand-in; see run.py."""
@@ -0,0 +1,109 @@
+"""
+Local HTTP stand-in for the FM API endpoints the app uses, for benchmarking fm_api:
+
+    GET /objects                      -> [ {id, name}, ... ]
+    GET /geozones                     -> {"items": [...], "continuation_token": <int, 0 at the end>}
+    GET /geozones/{id}                -> one geozone with geometry
+    GET /objects/{id}/trips           -> {"trips": [...], "continuation_token": <str or null>}
+
+Every request sleeps `latency` seconds; pages hold min(limit, page_size) items.
+"""
+import bisect
+import datetime as dt
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+_GEOMETRY_KEYS = ("circle", "feature")
+
+
+def _epoch(ts: str) -> float:
+    return dt.datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp()
+
+
+class FakeFmApi:
+    def __init__(self, objects: List[Dict[str, Any]], geozones: List[Dict[str, Any]],
+                 trips: Dict[str, List[Dict[str, Any]]], latency: float = 0.0, page_size: int = 500):
+        self.objects = objects
+        self.geozones = geozones
+        self._by_id = {g.get("id"): g for g in geozones}
+        # trips per object, sorted by start, with start epochs for range queries
+        self.trips = {oid: sorted(ts, key=lambda t: t["trip_start"]["datetime"]) for oid, ts in trips.items()}
+        self._starts = {oid: [_epoch(t["trip_start"]["datetime"]) for t in ts] for oid, ts in self.trips.items()}
+        self.latency = latency
+        self.page_size = page_size
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeFmApi":
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                with api._lock:
+                    api.requests += 1
+                if api.latency:
+                    time.sleep(api.latency)
+                u = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(u.query).items()}
+                status, body = api.handle(u.path, q)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeFmApi":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def handle(self, path: str, q: Dict[str, str]) -> Tuple[int, Any]:
+        limit = min(int(q.get("limit") or 500), self.page_size)
+        parts = path.strip("/").split("/")
+        if parts == ["objects"]:
+            return 200, self.objects
+        if parts == ["geozones"]:
+            start = int(q.get("continuation_token") or 0)
+            page = self.geozones[start:start + limit]
+            if q.get("include_geometry") in (None, "0"):
+                page = [{k: v for k, v in g.items() if k not in _GEOMETRY_KEYS} for g in page]
+            nxt = start + limit if start + limit < len(self.geozones) else 0
+            return 200, {"items": page, "continuation_token": nxt}
+        if len(parts) == 2 and parts[0] == "geozones":
+            g = self._by_id.get(int(parts[1])) if parts[1].isdigit() else None
+            return (200, g) if g is not None else (404, {"error": "not found"})
+        if len(parts) == 3 and parts[0] == "objects" and parts[2] == "trips":
+            trips, starts = self.trips.get(parts[1], []), self._starts.get(parts[1], [])
+            lo = bisect.bisect_left(starts, _epoch(q["from_datetime"]))
+            hi = bisect.bisect_right(starts, _epoch(q["to_datetime"]))
+            start = lo + int(q.get("continuation_token") or 0)
+            end = min(start + limit, hi)
+            nxt = str(end - lo) if end < hi else None
+            return 200, {"trips": trips[start:end], "continuation_token": nxt}
+        return 404, {"error": f"unknown path {path}"}
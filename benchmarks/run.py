@@ -0,0 +1,289 @@
+"""
+Benchmark the geozone, merge, report and API paths on synthetic data; results go to JSON.
+
+    python -m benchmarks.run --scale small --out bench.json
+    python -m benchmarks.run --scale medium --out new.json --compare bench.json
+    python -m benchmarks.run --only merge --repeat 5
+
+Run from the repository root. Cases that need code a given version does not have (checked up
+front with missing()) are recorded as skipped, so result files from different versions stay
+comparable; any other error fails the run.
+"""
+import argparse
+import datetime as dt
+import functools
+import gc
+import inspect
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.fake_api import FakeFmApi
+from benchmarks.synthetic import make_geozones, make_objects, make_trips
+
+SCALES: Dict[str, Dict[str, Any]] = {
+    "small": {"zones": [1000], "trips": [1000, 10000], "legacy_points": 200,
+              "api_zones": 1000, "api_trips": 5000, "api_vehicles": 8},
+    "medium": {"zones": [1000, 10000], "trips": [10000, 100000], "legacy_points": 200,
+               "api_zones": 5000, "api_trips": 20000, "api_vehicles": 16},
+    "large": {"zones": [1000, 10000, 50000], "trips": [10000, 100000, 1000000], "legacy_points": 100,
+              "api_zones": 20000, "api_trips": 100000, "api_vehicles": 50},
+}
+
+
+class Runner:
+    def __init__(self, repeat: int, only: Optional[str]):
+        self.repeat = repeat
+        self.only = only
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def bench(self, name: str, fn: Callable[[], Any], items: Optional[int] = None,
+              setup: Optional[Callable[[], Any]] = None, skip: Optional[str] = None, **params: Any) -> None:
+        """
+        Time fn() `repeat` times (setup() runs untimed before each); keeps every run and the best.
+        skip (from missing()) records the case as skipped: the version under test lacks the feature.
+        """
+        key = name + ("[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]" if params else "")
+        if self.only and self.only not in key:
+            return
+        if skip:
+            self.results[key] = {"params": params, "skipped": skip}
+            print(f"{key:<72} skipped ({skip})")
+            return
+        runs = []
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            gc.collect()
+            t0 = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - t0)
+        best = min(runs)
+        rec: Dict[str, Any] = {"params": params, "runs_s": runs, "best_s": best, "median_s": statistics.median(runs)}
+        if items:
+            rec["items"] = items
+            rec["us_per_item"] = best / items * 1e6
+        self.results[key] = rec
+        print(f"{key:<72} {best * 1000:12.2f} ms" + (f"  ({rec['us_per_item']:.2f} us/item)" if items else ""))
+
+
+def missing(obj: Any, *names: str) -> Optional[str]:
+    """Reason to skip if obj (a module, class or function) lacks any of the attributes or parameters."""
+    if obj is None:
+        return "module not available"
+    try:
+        params = inspect.signature(obj).parameters if callable(obj) else {}
+    except (TypeError, ValueError):
+        params = {}
+    for name in names:
+        if not hasattr(obj, name) and name not in params:
+            return f"{getattr(obj, '__name__', obj)} has no {name}"
+    return None
+
+
+def endpoints(trips: List[Dict[str, Any]]) -> Tuple[List[float], List[float]]:
+    pts = [t.get(side) or {} for t in trips for side in ("trip_start", "trip_end")]
+    return [p.get("latitude") for p in pts], [p.get("longitude") for p in pts]
+
+
+def bench_geozones(r: Runner, scale: Dict[str, Any]) -> None:
+    import geoutils
+
+    no_index = missing(geoutils, "GeozoneIndex")
+    no_batch = no_index or missing(geoutils, "geozones_for_points")
+    no_memo = no_index or missing(geoutils, "ZONE_MEMO")
+    for n_zones in scale["zones"]:
+        zones = make_geozones(n_zones)
+        lats, lons = endpoints(make_trips(10000, zones))
+        n = scale["legacy_points"]
+        # the original per-point scan over the raw list
+        r.bench("geozones_for_point.list", lambda: [geoutils.geozones_for_point(a, b, zones)
+                                                    for a, b in zip(lats[:n], lons[:n])], items=n, zones=n_zones)
+        r.bench("GeozoneIndex.build", lambda: geoutils.GeozoneIndex(zones), items=n_zones, zones=n_zones,
+                skip=no_index)
+
+        index = memo_index = None
+        if not no_index:
+            # exact lookups; versions without the memo have nothing to turn off
+            index = geoutils.GeozoneIndex(zones) if no_memo else geoutils.GeozoneIndex(zones, memo=None)
+        if not no_memo:
+            memo_index = geoutils.GeozoneIndex(zones)
+        r.bench("geozones_for_point.index", lambda: [geoutils.geozones_for_point(a, b, index)
+                                                     for a, b in zip(lats, lons)], items=len(lats), zones=n_zones,
+                skip=no_index)
+        r.bench("geozones_for_points.batch", lambda: geoutils.geozones_for_points(lats, lons, index),
+                items=len(lats), zones=n_zones, skip=no_batch)
+        r.bench("geozones_for_points.memo_cold", lambda: memo_index.lookup_many(lats, lons),
+                setup=lambda: geoutils.ZONE_MEMO.clear(), items=len(lats), zones=n_zones, skip=no_memo)
+        r.bench("geozones_for_points.memo_warm", lambda: memo_index.lookup_many(lats, lons),
+                items=len(lats), zones=n_zones, skip=no_memo)
+
+
+def bench_pipeline(r: Runner, scale: Dict[str, Any]) -> None:
+    import geoutils
+    import transforms
+    from zoneinfo import ZoneInfo
+
+    # imported up front so the first timed run does not pay for it; missing -> skipped cases
+    try:
+        import export
+        import report
+    except ImportError:
+        export = report = None
+
+    no_table = missing(transforms, "TripTable") or missing(transforms.TripTable, "sorted_by_start", "merge_short")
+    no_report = no_table or missing(report, "iter_report_rows")
+    no_export = no_report or missing(export, "export_rows")
+    zones = make_geozones(scale["zones"][0])
+    # versions before the index take the raw list
+    index = zones if missing(geoutils, "GeozoneIndex") else geoutils.GeozoneIndex(zones)
+    tz = ZoneInfo("Europe/Vienna")
+    for n_trips in scale["trips"]:
+        trips = make_trips(n_trips, zones)
+        r.bench("merge_short_trips", lambda: transforms.merge_short_trips(trips, 5, 10), items=n_trips, trips=n_trips)
+        r.bench("trips_to_zone_pairs", lambda: transforms.trips_to_zone_pairs(trips, index),
+                items=n_trips, trips=n_trips)
+        r.bench("TripTable.from_trips", lambda: transforms.TripTable.from_trips(trips), items=n_trips, trips=n_trips,
+                skip=no_table)
+        table = None if no_table else transforms.TripTable.from_trips(trips).sorted_by_start()
+        r.bench("TripTable.merge_short", lambda: table.merge_short(5, 10), items=n_trips, trips=n_trips,
+                skip=no_table)
+
+        # the app's per-trip row building (MODE 2) and zone-pair report (MODE 1), formatted
+        def report_rows(merge: bool) -> Callable[[], Any]:
+            def run() -> Any:
+                return list(report.iter_report_rows(table.merge_short(0, 10), index, merge, False, tz))
+            return run
+
+        r.bench("report.detailed_rows", report_rows(False), items=n_trips, trips=n_trips, skip=no_report)
+        r.bench("report.zone_pairs", report_rows(True), items=n_trips, trips=n_trips, skip=no_report)
+
+        def export_csv() -> Any:
+            rows = report.iter_report_rows(table.merge_short(0, 10), index, False, False, tz, html=False)
+            export.export_rows(rows, "csv", io.BytesIO())
+
+        r.bench("export.csv", export_csv, items=n_trips, trips=n_trips, skip=no_export)
+
+
+class ModuleApi:
+    """fm_api's module-level functions, for versions without FmClient, pointed at the fake server."""
+
+    def __init__(self, fm_api: Any, url: str, api_key: str = "bench"):
+        fm_api.FM_API_BASE = url
+        self.fm_api = fm_api
+        self.api_key = api_key
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        return functools.partial(getattr(self.fm_api, name), self.api_key)
+
+    def close(self) -> None:
+        pass
+
+
+def bench_api(r: Runner, scale: Dict[str, Any], latency: float, page_size: int) -> None:
+    import fm_api
+
+    zones = make_geozones(scale["api_zones"])
+    objects = make_objects(scale["api_vehicles"])
+    trips = {o["id"]: make_trips(scale["api_trips"], zones, seed=i) for i, o in enumerate(objects)}
+    last_end = max(ts[-1]["trip_end"]["datetime"] for ts in trips.values())
+    from_dt = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+    to_dt = dt.datetime.fromisoformat(last_end.replace("Z", "+00:00")) + dt.timedelta(seconds=1)
+    params = {"latency_ms": int(latency * 1000), "page_size": page_size}
+
+    with FakeFmApi(objects, zones, trips, latency=latency, page_size=page_size) as api:
+        if missing(fm_api, "FmClient"):
+            client = ModuleApi(fm_api, api.url)
+        elif missing(fm_api.FmClient, "rate_limiter"):
+            client = fm_api.FmClient("bench", base_url=api.url)
+        else:
+            client = fm_api.FmClient("bench", base_url=api.url, rate_limiter=None)
+        oid = objects[0]["id"]
+        n_trips = scale["api_trips"]
+        r.bench("fm_api.list_objects", lambda: client.list_objects(), **params)
+        r.bench("fm_api.list_geozones", lambda: client.list_geozones(), items=len(zones), zones=len(zones), **params)
+        r.bench("fm_api.find_trips", lambda: client.find_trips(from_dt, to_dt, oid),
+                items=n_trips, trips=n_trips, **params)
+        r.bench("fm_api.find_trips.sliced", lambda: client.find_trips(from_dt, to_dt, oid, slices=8),
+                items=n_trips, trips=n_trips, slices=8, skip=missing(fm_api.find_trips, "slices"), **params)
+        r.bench("fm_api.find_trips_many", lambda: list(client.find_trips_many([o["id"] for o in objects], from_dt, to_dt)),
+                items=n_trips * len(objects), vehicles=len(objects), trips=n_trips,
+                skip=missing(fm_api, "find_trips_many"), **params)
+        client.close()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Print best-time ratios new/old for the cases both files ran."""
+    print(f"\n{'case':<72} {'old ms':>10} {'new ms':>10} {'new/old':>8}")
+    for key, rec in new["results"].items():
+        prev = old.get("results", {}).get(key)
+        if not prev or "best_s" not in prev or "best_s" not in rec:
+            continue
+        print(f"{key:<72} {prev['best_s'] * 1000:10.2f} {rec['best_s'] * 1000:10.2f} "
+              f"{rec['best_s'] / prev['best_s']:8.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(prog="benchmarks.run", description=__doc__.split("\n\n")[0])
+    p.add_argument("--scale", choices=list(SCALES), default="small")
+    p.add_argument("--repeat", type=int, default=3, help="timed runs per case (best is reported)")
+    p.add_argument("--only", help="run only cases whose name contains this text")
+    p.add_argument("--groups", default="geozones,pipeline,api", help="comma-separated: geozones, pipeline, api")
+    p.add_argument("--latency-ms", type=float, default=20.0, help="fake API latency per request")
+    p.add_argument("--page-size", type=int, default=500, help="fake API max items per page")
+    p.add_argument("--out", default="bench.json", help="JSON results file")
+    p.add_argument("--compare", help="earlier JSON results to compare against")
+    args = p.parse_args(argv)
+
+    scale = SCALES[args.scale]
+    r = Runner(args.repeat, args.only)
+    groups = set(args.groups.split(","))
+    started = time.time()
+    if "geozones" in groups:
+        bench_geozones(r, scale)
+    if "pipeline" in groups:
+        bench_pipeline(r, scale)
+    if "api" in groups:
+        bench_api(r, scale, args.latency_ms / 1000.0, args.page_size)
+
+    out = {
+        "meta": {
+            "started": dt.datetime.fromtimestamp(started, dt.timezone.utc).isoformat(),
+            "seconds": round(time.time() - started, 3),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "latency_ms": args.latency_ms,
+            "page_size": args.page_size,
+        },
+        "results": r.results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(out, f, indent=2)
+    print(f"\nwrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
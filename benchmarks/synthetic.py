@@ -0,0 +1,105 @@
+"""Synthetic geozone catalogs and trip histories shaped like FM API responses."""
+import datetime as dt
+import math
+import random
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Roughly Hungary / Austria, where the app's time zones point
+LAT_RANGE = (45.5, 48.5)
+LON_RANGE = (16.0, 23.0)
+
+CIRCLE_RADII_M = (50, 150, 500, 2000, 10000)
+POLYGON_VERTICES = (4, 16, 64, 256, 1024)
+
+
+def _ring(rnd: random.Random, lat: float, lon: float, n_vertices: int, radius_deg: float) -> List[List[float]]:
+    # Star-shaped (so simple) ring: one jittered radius per vertex, closed
+    ring = []
+    for j in range(n_vertices):
+        a = 2 * math.pi * j / n_vertices
+        r = radius_deg * rnd.uniform(0.6, 1.0)
+        ring.append([lon + r * math.cos(a) / math.cos(math.radians(lat)), lat + r * math.sin(a)])
+    ring.append(ring[0])
+    return ring
+
+
+def make_geozones(n: int, polygon_share: float = 0.5, vertices: Sequence[int] = POLYGON_VERTICES,
+                  seed: int = 1) -> List[Dict[str, Any]]:
+    """n geozones as list_geozones() returns them: POINT circles plus POLYGON / MULTIPOLYGON features."""
+    rnd = random.Random(seed)
+    zones: List[Dict[str, Any]] = []
+    for i in range(n):
+        lat, lon = rnd.uniform(*LAT_RANGE), rnd.uniform(*LON_RANGE)
+        if rnd.random() >= polygon_share:
+            zones.append({"id": i, "name": f"circle-{i}", "type": "POINT",
+                          "circle": {"latitude": lat, "longitude": lon, "radius": rnd.choice(CIRCLE_RADII_M)}})
+            continue
+        k = rnd.choice(vertices)
+        radius = rnd.uniform(0.001, 0.03)
+        if rnd.random() < 0.1:
+            # a few multipolygons, the second part with a hole
+            parts = [[_ring(rnd, lat, lon, k, radius)],
+                     [_ring(rnd, lat + 3 * radius, lon, k, radius), _ring(rnd, lat + 3 * radius, lon, 8, radius / 4)]]
+            geometry = {"type": "MultiPolygon", "coordinates": parts}
+            gtype = "MULTIPOLYGON"
+        else:
+            geometry = {"type": "Polygon", "coordinates": [_ring(rnd, lat, lon, k, radius)]}
+            gtype = "POLYGON"
+        zones.append({"id": i, "name": f"polygon-{i}", "type": gtype, "feature": {"geometry": geometry}})
+    return zones
+
+
+def zone_anchor(zone: Dict[str, Any]) -> Tuple[float, float]:
+    """A (lat, lon) inside or next to a zone, for placing trip endpoints at known sites."""
+    circle = zone.get("circle")
+    if circle:
+        return circle["latitude"], circle["longitude"]
+    coords = zone["feature"]["geometry"]["coordinates"]
+    ring = coords[0][0] if zone["type"] == "MULTIPOLYGON" else coords[0]
+    lon = sum(p[0] for p in ring[:-1]) / (len(ring) - 1)
+    lat = sum(p[1] for p in ring[:-1]) / (len(ring) - 1)
+    return lat, lon
+
+
+def make_trips(n: int, geozones: List[Dict[str, Any]], n_sites: int = 200, site_share: float = 0.7,
+               start: dt.datetime = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc),
+               seed: int = 2) -> List[Dict[str, Any]]:
+    """
+    One vehicle's history as find_trips() returns it (chronological, whole-second 'Z' timestamps).
+
+    Vehicles shuttle between a fixed set of sites (depots, customers) taken from the geozones,
+    with GPS jitter of a few metres; the rest of the endpoints are random.
+    """
+    rnd = random.Random(seed)
+    sites = [zone_anchor(z) for z in rnd.sample(geozones, min(n_sites, len(geozones)))] if geozones else []
+
+    def endpoint() -> Tuple[float, float]:
+        if sites and rnd.random() < site_share:
+            lat, lon = rnd.choice(sites)
+            return lat + rnd.gauss(0, 2e-5), lon + rnd.gauss(0, 2e-5)
+        return rnd.uniform(*LAT_RANGE), rnd.uniform(*LON_RANGE)
+
+    trips: List[Dict[str, Any]] = []
+    t = start
+    here = endpoint()
+    for i in range(n):
+        duration = rnd.choice((60, 300, 900, 1800, 3600, 7200))
+        stop = rnd.choice((0, 60, 300, 600, 1800, 3600, 14400, 50400))
+        there = endpoint()
+        end = t + dt.timedelta(seconds=duration)
+        trips.append({
+            "trip_start": {"datetime": t.strftime("%Y-%m-%dT%H:%M:%SZ"), "latitude": here[0], "longitude": here[1],
+                           "address": {"country": "HU", "locality": f"Town {i % 97}", "street": f"Street {i % 13}"}},
+            "trip_end": {"datetime": end.strftime("%Y-%m-%dT%H:%M:%SZ"), "latitude": there[0], "longitude": there[1],
+                         "address": {"country": "HU", "locality": f"Town {(i + 1) % 97}", "street": f"Street {i % 11}"}},
+            "mileage": round(duration * rnd.uniform(5.0, 25.0), 1),
+            "trip_duration": duration,
+            "trip_type": rnd.choice(("BUSINESS", "PRIVATE", None)),
+        })
+        t = end + dt.timedelta(seconds=stop)
+        here = there
+    return trips
+
+
+def make_objects(n: int) -> List[Dict[str, Any]]:
+    return [{"id": str(1000 + i), "name": f"Vehicle {i}"} for i in range(n)]
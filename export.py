@@ -0,0 +1,120 @@
+"""
+Chunked logbook export to CSV, Parquet and XLSX straight from report.iter_report_rows().
+
+Rows are written in chunks as they come out of the pipeline; no DataFrame or HTML is built.
+Parquet needs pyarrow, XLSX needs xlsxwriter or openpyxl; formats whose library is missing
+are left out of available_formats().
+"""
+import csv
+import io
+from itertools import islice
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List
+
+from metrics import timed
+from report import REPORT_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional
+    pa = pq = None
+
+try:
+    import xlsxwriter
+except ImportError:  # optional
+    xlsxwriter = None
+
+try:
+    import openpyxl
+except ImportError:  # optional
+    openpyxl = None
+
+CHUNK_ROWS = 10_000
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int = CHUNK_ROWS) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def write_csv(rows: Iterable[Dict[str, Any]], out: BinaryIO, columns: List[str] = REPORT_COLUMNS) -> None:
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for chunk in _chunks(rows):
+        writer.writerows([row.get(c) for c in columns] for row in chunk)
+    text.detach()  # leave `out` open for the caller
+
+
+def write_parquet(rows: Iterable[Dict[str, Any]], out: BinaryIO, columns: List[str] = REPORT_COLUMNS) -> None:
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    # Distances are whole km or 3-decimal floats depending on raw mode; one float column fits both
+    schema = pa.schema([(c, pa.float64() if c == "Distance (km)" else pa.string()) for c in columns])
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in _chunks(rows):
+            writer.write_table(pa.Table.from_pylist(
+                [{c: row.get(c) for c in columns} for row in chunk], schema=schema))
+
+
+def write_xlsx(rows: Iterable[Dict[str, Any]], out: BinaryIO, columns: List[str] = REPORT_COLUMNS) -> None:
+    if xlsxwriter is not None:
+        # constant_memory flushes each row to a temp file once the next one starts
+        wb = xlsxwriter.Workbook(out, {"constant_memory": True})
+        ws = wb.add_worksheet("Logbook")
+        ws.write_row(0, 0, columns)
+        r = 1
+        for chunk in _chunks(rows):
+            for row in chunk:
+                ws.write_row(r, 0, [row.get(c) for c in columns])
+                r += 1
+        wb.close()
+    elif openpyxl is not None:
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Logbook")
+        ws.append(columns)
+        for chunk in _chunks(rows):
+            for row in chunk:
+                ws.append([row.get(c) for c in columns])
+        wb.save(out)
+    else:
+        raise RuntimeError("XLSX export needs xlsxwriter or openpyxl (pip install xlsxwriter)")
+
+
+WRITERS: Dict[str, Callable[[Iterable[Dict[str, Any]], BinaryIO], None]] = {
+    "csv": write_csv,
+    "parquet": write_parquet,
+    "xlsx": write_xlsx,
+}
+
+
+def available_formats() -> List[str]:
+    """Export formats whose libraries are installed, in menu order."""
+    fmts = ["csv"]
+    if pa is not None:
+        fmts.append("parquet")
+    if xlsxwriter is not None or openpyxl is not None:
+        fmts.append("xlsx")
+    return fmts
+
+
+def export_rows(rows: Iterable[Dict[str, Any]], fmt: str, out: BinaryIO) -> None:
+    """Write report rows to a binary stream in `fmt` ('csv', 'parquet' or 'xlsx')."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    with timed(f"export.{fmt}"):
+        WRITERS[fmt](rows, out)
+
+
+def export_bytes(rows: Iterable[Dict[str, Any]], fmt: str) -> bytes:
+    """export_rows() into memory, e.g. for a download button."""
+    buf = io.BytesIO()
+    export_rows(rows, fmt, buf)
+    return buf.getvalue()
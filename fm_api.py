@@ -1,75 +1,421 @@
 import datetime as dt
-from typing import Any, Dict, List, Optional
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import incr, timed
 
 FM_API_BASE = "https://api.fm-track.com"
 
+Timeout = Union[float, Tuple[float, float]]
+# on_page(number of trips on the page), see FmClient.find_trips()
+PageCallback = Callable[[int], None]
+
+# Responses worth retrying: rate limited or a transient server/gateway error
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RateLimiter:
+    """Thread-safe token bucket: `rate` requests per second on average, bursts up to `burst`."""
+
+    def __init__(self, rate: float = 10.0, burst: int = 10):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def configure(self, rate: float, burst: int) -> None:
+        with self._lock:
+            self.rate = float(rate)
+            self.burst = float(burst)
+            self._tokens = min(self._tokens, self.burst)
+
+
+# Request budget per API key for get_client() clients; LOGBOOK_FM_RATE / LOGBOOK_FM_BURST override
+RATE_LIMIT = float(os.environ.get("LOGBOOK_FM_RATE", "10"))
+RATE_BURST = int(os.environ.get("LOGBOOK_FM_BURST", "10"))
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), if present."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - dt.datetime.now(dt.timezone.utc)).total_seconds())
+
+
+class FmClient:
+    """
+    FM API client that keeps one pooled keep-alive session for all requests.
+    Requests go through `rate_limiter` if one is given; get_client() gives each API key its own.
+    """
+
+    def __init__(self,
+                 api_key: str,
+                 base_url: Optional[str] = None,
+                 timeout: Timeout = (10, 60),
+                 pool_maxsize: int = 16,
+                 max_retries: int = 5,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.api_key = api_key
+        # None follows FM_API_BASE, read on every request like the module-level functions did
+        self._base_url = base_url.rstrip("/") if base_url else None
+        # (connect, read) seconds, or a single value for both
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.pool_maxsize = pool_maxsize
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url or FM_API_BASE.rstrip("/")
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "FmClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _get(self, url: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+        # Add API key and version if not present, then send a GET request
+        params = dict(params or {})
+        params["api_key"] = self.api_key
+        if "version=" not in url and "version" not in params:
+            params["version"] = 1
+        headers = {"Content-Type": "application/json;charset=UTF-8"}
+        return self._send("GET", url, RETRY_STATUSES, params=params, headers=headers)
+
+    def _post(self, url: str, payload: Dict[str, Any]) -> requests.Response:
+        # Send a POST request with API key and version
+        params = {"api_key": self.api_key, "version": 1}
+        headers = {"Content-Type": "application/json"}
+        # POST is not idempotent: only retry when the server explicitly rejected it
+        return self._send("POST", url, frozenset({429}), params=params, json=payload, headers=headers)
+
+    def _send(self, method: str, url: str, retry_statuses: frozenset, **kwargs: Any) -> requests.Response:
+        """
+        Send through the rate limiter, retrying transient failures with exponential backoff
+        and full jitter (or the server's Retry-After). Paginated callers retry the same page,
+        so a long pagination resumes from its last good continuation_token.
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            incr("fm_api.requests")
+            try:
+                with timed("fm_api.request"):
+                    resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                    incr("fm_api.bytes_received", len(resp.content))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries or method != "GET":
+                    raise
+                delay = None
+            else:
+                if resp.status_code not in retry_statuses or attempt >= self.max_retries:
+                    return resp
+                delay = _retry_after(resp)
+            if delay is None:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            incr("fm_api.retries")
+            time.sleep(min(delay, self.backoff_max))
+            attempt += 1
+
+    def list_objects(self, limit: int = 500) -> List[Dict[str, Any]]:
+        # Retrieve a list of objects from the FM API
+        resp = self._get(f"{self.base_url}/objects", params={"limit": limit})
+        if resp.status_code != 200:
+            raise RuntimeError(f"Objects GET failed: {resp.status_code} - {resp.text}")
+        data = resp.json()
+        if not isinstance(data, list):
+            raise RuntimeError("Objects response is not a list")
+        return data
+
+    def _iter_pages(self,
+                    fetch_page: Callable[[Any], Tuple[List[Dict[str, Any]], Any]],
+                    token: Any,
+                    prefetch: bool = True) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield pages from fetch_page(token) -> (items, next_token) until next_token is None.
+        With prefetch, the next page is requested in the background while the caller
+        works on the current one.
+        """
+        if not prefetch:
+            while token is not None:
+                items, token = fetch_page(token)
+                yield items
+            return
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            fut = pool.submit(fetch_page, token)
+            while fut is not None:
+                items, token = fut.result()
+                fut = pool.submit(fetch_page, token) if token is not None else None
+                yield items
+
+    def iter_geozones(self,
+                      limit: int = 500,
+                      include_geometry: bool = True,
+                      prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """Geozones one by one as their pages arrive; see list_geozones()."""
+        def fetch_page(continuation_token: Any) -> Tuple[List[Dict[str, Any]], Any]:
+            params = {"limit": limit, "continuation_token": continuation_token,
+                      "include_geometry": 1 if include_geometry else 0}
+            resp = self._get(f"{self.base_url}/geozones", params=params)
+            if resp.status_code != 200:
+                raise RuntimeError(f"Geozones GET failed: {resp.status_code} - {resp.text}")
+            data = resp.json()
+            page_items = data.get("items", []) or []
+            incr("fm_api.geozone_pages")
+            ct = data.get("continuation_token", 0)
+            # Stop if no continuation token or no more items
+            return page_items, (ct if ct and page_items else None)
+
+        for page in self._iter_pages(fetch_page, 0, prefetch):
+            yield from page
+
+    def list_geozones(self, limit: int = 500, include_geometry: bool = True) -> List[Dict[str, Any]]:
+        """Returns geozones with geometry (POINT circle or POLYGON coordinates); include_geometry=False for a light listing."""
+        return list(self.iter_geozones(limit, include_geometry, prefetch=False))
+
+    def get_geozone(self, geozone_id: Any) -> Dict[str, Any]:
+        """Single geozone with geometry."""
+        resp = self._get(f"{self.base_url}/geozones/{geozone_id}", params={"include_geometry": 1})
+        if resp.status_code != 200:
+            raise RuntimeError(f"Geozone GET failed: {resp.status_code} - {resp.text}")
+        return resp.json()
+
+    def find_trips(self,
+                   from_dt: dt.datetime,
+                   to_dt: dt.datetime,
+                   object_id: str,
+                   limit: int = 500,
+                   slices: int = 1,
+                   max_concurrency: Optional[int] = None,
+                   on_page: Optional[PageCallback] = None) -> List[Dict[str, Any]]:
+        """
+        Trips of one object within [from_dt, to_dt].
+
+        With slices > 1 the range is split into that many sub-windows that are paginated
+        concurrently, then stitched back in chronological order; trips crossing a window
+        boundary are returned by both windows and kept once (matched on trip_start datetime).
+        on_page(n_trips) is called after every page, e.g. for progress reporting; it may be
+        called from several threads, and an exception it raises aborts the fetch.
+        """
+        if slices > 1 and to_dt > from_dt:
+            return self._find_trips_sliced(from_dt, to_dt, object_id, limit, slices, max_concurrency, on_page)
+        return list(self.iter_trips(from_dt, to_dt, object_id, limit, prefetch=False, on_page=on_page))
+
+    def iter_trips(self,
+                   from_dt: dt.datetime,
+                   to_dt: dt.datetime,
+                   object_id: str,
+                   limit: int = 500,
+                   prefetch: bool = True,
+                   on_page: Optional[PageCallback] = None) -> Iterator[Dict[str, Any]]:
+        """Trips one by one as their pages arrive; see find_trips()."""
+        def fetch_page(continuation_token: Any) -> Tuple[List[Dict[str, Any]], Any]:
+            params = {
+                "from_datetime": from_dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "to_datetime": to_dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "limit": limit,
+                "continuation_token": continuation_token or None
+            }
+            resp = self._get(f"{self.base_url}/objects/{object_id}/trips", params=params)
+            if resp.status_code != 200:
+                raise RuntimeError(f"Trips GET failed: {resp.status_code} - {resp.text}")
+            data = resp.json()
+            trips = data.get("trips", []) or []
+            incr("fm_api.trip_pages")
+            incr("fm_api.trips", len(trips))
+            if on_page is not None:
+                on_page(len(trips))
+            # Stop if there is no continuation token
+            return trips, data.get("continuation_token") or None
+
+        # "" stands for the first page, which is requested without a token
+        for page in self._iter_pages(fetch_page, "", prefetch):
+            yield from page
+
+    def _find_trips_sliced(self,
+                           from_dt: dt.datetime,
+                           to_dt: dt.datetime,
+                           object_id: str,
+                           limit: int,
+                           slices: int,
+                           max_concurrency: Optional[int],
+                           on_page: Optional[PageCallback] = None) -> List[Dict[str, Any]]:
+        # Whole-second boundaries, since the API only takes second precision
+        total_s = int((to_dt - from_dt).total_seconds())
+        slices = max(1, min(int(slices), total_s))
+        bounds = [from_dt + dt.timedelta(seconds=total_s * k // slices) for k in range(slices)] + [to_dt]
+        windows = list(zip(bounds[:-1], bounds[1:]))
+
+        workers = min(len(windows), int(max_concurrency or len(windows)))
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            pages = list(pool.map(lambda w: self.find_trips(w[0], w[1], object_id, limit, on_page=on_page), windows))
+
+        trips: List[Dict[str, Any]] = []
+        seen: set = set()
+        for window_trips in pages:
+            for t in window_trips:
+                key = (t.get("trip_start") or {}).get("datetime")
+                if key is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                trips.append(t)
+        return trips
+
+    def find_trips_many(self,
+                        object_ids: Iterable[str],
+                        from_dt: dt.datetime,
+                        to_dt: dt.datetime,
+                        max_concurrency: int = 8,
+                        limit: int = 500,
+                        return_exceptions: bool = False,
+                        fetch: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+                        ) -> Iterator[Tuple[str, Union[List[Dict[str, Any]], Exception]]]:
+        """
+        Fetch trips for many objects at once on a bounded thread pool.
+
+        Yields (object_id, trips) in completion order. With return_exceptions=True a failed
+        object yields (object_id, exception) instead of aborting the whole run.
+        fetch(object_id) replaces the plain find_trips() call, e.g. to go through the trip cache.
+        Keep max_concurrency <= pool_maxsize so every worker gets a pooled connection.
+        """
+        if fetch is None:
+            def fetch(oid: str) -> List[Dict[str, Any]]:
+                return self.find_trips(from_dt, to_dt, oid, limit)
+
+        with ThreadPoolExecutor(max_workers=max(1, int(max_concurrency))) as pool:
+            futures = {pool.submit(fetch, oid): oid for oid in object_ids}
+            try:
+                for fut in as_completed(futures):
+                    oid = futures[fut]
+                    try:
+                        trips = fut.result()
+                    except Exception as e:
+                        if not return_exceptions:
+                            raise
+                        yield oid, e
+                    else:
+                        yield oid, trips
+            finally:
+                # stop queued fetches if the caller bails out early
+                for fut in futures:
+                    fut.cancel()
+
+
+_clients: Dict[str, FmClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str) -> FmClient:
+    """
+    Process-wide FmClient for an API key, so module-level calls share one connection pool.
+    Each key gets its own RATE_LIMIT bucket: one tenant's fetches do not slow down another's.
+    """
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = FmClient(api_key, rate_limiter=RateLimiter(RATE_LIMIT, RATE_BURST))
+        return client
+
+
+def set_rate_limit(rate: float, burst: Optional[int] = None) -> None:
+    """Change the per-key request budget, for clients made from now on and the existing ones."""
+    global RATE_LIMIT, RATE_BURST
+    with _clients_lock:
+        RATE_LIMIT = float(rate)
+        RATE_BURST = max(1, int(burst)) if burst is not None else RATE_BURST
+        for client in _clients.values():
+            if client.rate_limiter is not None:
+                client.rate_limiter.configure(RATE_LIMIT, RATE_BURST)
+
+
 def _get(url: str, api_key: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
-    # Add API key and version if not present, then send a GET request
-    params = dict(params or {})
-    params["api_key"] = api_key
-    if "version=" not in url and "version" not in params:
-        params["version"] = 1
-    headers = {"Content-Type": "application/json;charset=UTF-8"}
-    return requests.get(url, params=params, headers=headers, timeout=60)
+    return get_client(api_key)._get(url, params)
 
 def _post(url: str, api_key: str, payload: Dict[str, Any]) -> requests.Response:
-    # Send a POST request with API key and version
-    params = {"api_key": api_key, "version": 1}
-    headers = {"Content-Type": "application/json"}
-    return requests.post(url, params=params, json=payload, headers=headers, timeout=60)
+    return get_client(api_key)._post(url, payload)
 
 def list_objects(api_key: str, limit: int = 500) -> List[Dict[str, Any]]:
-    # Retrieve a list of objects from the FM API
-    resp = _get(f"{FM_API_BASE}/objects", api_key, params={"limit": limit})
-    if resp.status_code != 200:
-        raise RuntimeError(f"Objects GET failed: {resp.status_code} - {resp.text}")
-    data = resp.json()
-    if not isinstance(data, list):
-        raise RuntimeError("Objects response is not a list")
-    return data
-
-def list_geozones(api_key: str, limit: int = 500) -> List[Dict[str, Any]]:
+    return get_client(api_key).list_objects(limit)
+
+def list_geozones(api_key: str, limit: int = 500, include_geometry: bool = True) -> List[Dict[str, Any]]:
     """Returns geozones with geometry (POINT circle or POLYGON coordinates)."""
-    items: List[Dict[str, Any]] = []
-    continuation_token: Optional[int] = 0
-    while True:
-        params = {"limit": limit, "continuation_token": continuation_token, "include_geometry": 1}
-        resp = _get(f"{FM_API_BASE}/geozones", api_key, params=params)
-        if resp.status_code != 200:
-            raise RuntimeError(f"Geozones GET failed: {resp.status_code} - {resp.text}")
-        data = resp.json()
-        page_items = data.get("items", []) or []
-        items.extend(page_items)
-        ct = data.get("continuation_token", 0)
-        # Stop if no continuation token or no more items
-        if not ct or len(page_items) == 0:
-            break
-        continuation_token = ct
-    return items
+    return get_client(api_key).list_geozones(limit, include_geometry)
+
+def iter_geozones(api_key: str, limit: int = 500, include_geometry: bool = True,
+                  prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+    return get_client(api_key).iter_geozones(limit, include_geometry, prefetch)
+
+def iter_trips(api_key: str,
+               from_dt: dt.datetime,
+               to_dt: dt.datetime,
+               object_id: str,
+               limit: int = 500,
+               prefetch: bool = True,
+               on_page: Optional[PageCallback] = None) -> Iterator[Dict[str, Any]]:
+    return get_client(api_key).iter_trips(from_dt, to_dt, object_id, limit, prefetch, on_page)
 
 def find_trips(api_key: str,
                from_dt: dt.datetime,
                to_dt: dt.datetime,
                object_id: str,
-               limit: int = 500) -> list[dict]:
-    # Retrieve trips for a specific object within a time range, handling pagination
-    trips: List[Dict[str, Any]] = []
-    continuation_token: Optional[str] = None
-    while True:
-        params = {
-            "from_datetime": from_dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "to_datetime": to_dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "limit": limit,
-            "continuation_token": continuation_token
-        }
-        resp = _get(f"{FM_API_BASE}/objects/{object_id}/trips", api_key, params=params)
-        if resp.status_code != 200:
-            raise RuntimeError(f"Trips GET failed: {resp.status_code} - {resp.text}")
-        data = resp.json()
-        trips.extend(data.get("trips", []) or [])
-        continuation_token = data.get("continuation_token")
-        # Stop if there is no continuation token
-        if not continuation_token:
-            break
-    return trips
+               limit: int = 500,
+               slices: int = 1,
+               max_concurrency: Optional[int] = None,
+               on_page: Optional[PageCallback] = None) -> list[dict]:
+    return get_client(api_key).find_trips(from_dt, to_dt, object_id, limit, slices, max_concurrency, on_page)
+
+def find_trips_many(api_key: str,
+                    object_ids: Iterable[str],
+                    from_dt: dt.datetime,
+                    to_dt: dt.datetime,
+                    max_concurrency: int = 8,
+                    limit: int = 500,
+                    return_exceptions: bool = False,
+                    fetch: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+                    ) -> Iterator[Tuple[str, Union[List[Dict[str, Any]], Exception]]]:
+    return get_client(api_key).find_trips_many(object_ids, from_dt, to_dt, max_concurrency, limit,
+                                               return_exceptions, fetch)
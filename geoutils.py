@@ -1,5 +1,15 @@
+import copy
 import math
-from typing import Dict, List, Optional
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from metrics import incr, timed
 
 def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     # Earth's radius in meters
@@ -10,6 +20,15 @@ def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
     return 2 * R * math.asin(math.sqrt(a))
 
+def haversine_m_np(lat1: np.ndarray, lon1: np.ndarray, lat2: float, lon2: float) -> np.ndarray:
+    """Vectorized haversine_m() from many points to one center."""
+    R = 6371000.0
+    phi1, phi2 = np.radians(lat1), math.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi/2)**2 + np.cos(phi1) * math.cos(phi2) * np.sin(dlambda/2)**2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
 def point_in_circle(lat: float, lon: float, circle: Dict) -> bool:
     # Check if a point is inside a circle
     if not circle:
@@ -21,12 +40,22 @@ def point_in_circle(lat: float, lon: float, circle: Dict) -> bool:
         return False
     return haversine_m(lat, lon, c_lat, c_lon) <= float(r)
 
-def point_in_polygon(lat: float, lon: float, polygon_coords: List[List[List[float]]]) -> bool:
-    """Ray casting on the first ring; coords are [[lon, lat], ...]."""
-    # Check if a point is inside a polygon (first ring only)
-    if not polygon_coords or not polygon_coords[0]:
-        return False
-    ring = polygon_coords[0]
+def points_in_ring(lats: np.ndarray, lons: np.ndarray, xs: np.ndarray, ys: np.ndarray,
+                   chunk: int = 1_000_000) -> np.ndarray:
+    """Vectorized crossing-number test of many points against one ring (same arithmetic as point_in_polygon)."""
+    x1, y1 = xs, ys
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    inside = np.zeros(len(lats), dtype=bool)
+    step = max(1, chunk // max(1, len(xs)))
+    for s in range(0, len(lats), step):
+        x = lons[s:s + step, None]
+        y = lats[s:s + step, None]
+        crosses = ((y1 > y) != (y2 > y)) & (x < (x2 - x1) * (y - y1) / (y2 - y1 + 1e-15) + x1)
+        inside[s:s + step] = (np.count_nonzero(crosses, axis=1) % 2) == 1
+    return inside
+
+def _point_in_ring(lat: float, lon: float, ring: List[List[float]]) -> bool:
+    # Ray casting on a single ring; coords are [[lon, lat], ...]
     x, y = lon, lat
     inside = False
     n = len(ring)
@@ -38,8 +67,19 @@ def point_in_polygon(lat: float, lon: float, polygon_coords: List[List[List[floa
             inside = not inside
     return inside
 
-def geozones_for_point(lat: Optional[float], lon: Optional[float], geozones: List[Dict]) -> List[str]:
+def point_in_polygon(lat: float, lon: float, polygon_coords: List[List[List[float]]]) -> bool:
+    """Ray casting; coords are GeoJSON rings [[lon, lat], ...]: inside the first ring and outside every hole."""
+    if not polygon_coords or not polygon_coords[0]:
+        return False
+    if not _point_in_ring(lat, lon, polygon_coords[0]):
+        return False
+    return not any(_point_in_ring(lat, lon, hole) for hole in polygon_coords[1:] if hole)
+
+def geozones_for_point(lat: Optional[float], lon: Optional[float],
+                       geozones: Union[List[Dict], "GeozoneIndex"]) -> List[str]:
     """Return geozone names that contain the point."""
+    if isinstance(geozones, GeozoneIndex):
+        return geozones.lookup(lat, lon)
     # Iterate through geozones and collect those containing the point
     if lat is None or lon is None:
         return []
@@ -49,9 +89,568 @@ def geozones_for_point(lat: Optional[float], lon: Optional[float], geozones: Lis
         if gtype == "POINT":
             if point_in_circle(lat, lon, g.get("circle")):
                 names.append(g.get("name"))
-        elif gtype == "POLYGON":
+        elif gtype in ("POLYGON", "MULTIPOLYGON"):
             geom = (g.get("feature") or {}).get("geometry") or {}
-            coords = geom.get("coordinates")
-            if coords and point_in_polygon(lat, lon, coords):
+            if any(point_in_polygon(lat, lon, part) for part in polygon_parts(geom)):
                 names.append(g.get("name"))
     return names
+
+
+EARTH_RADIUS_M = 6371000.0
+
+BBox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+
+def _circle_bbox(c_lat: float, c_lon: float, r: float) -> Optional[BBox]:
+    """Conservative box around a haversine circle; None if unbounded."""
+    ang = r / EARTH_RADIUS_M
+    if ang >= math.pi / 2:
+        return None
+    dlat = math.degrees(ang)
+    min_lat, max_lat = c_lat - dlat, c_lat + dlat
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return None
+    # cos(lat) is smallest at the edge of the latitude band that is farthest from the equator
+    cos_min = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    ratio = math.sin(ang / 2) / math.sqrt(math.cos(math.radians(c_lat)) * cos_min)
+    if ratio >= 1.0:
+        return None
+    dlon = math.degrees(2 * math.asin(ratio))
+    min_lon, max_lon = c_lon - dlon, c_lon + dlon
+    if min_lon < -180.0 or max_lon > 180.0:
+        # crosses the antimeridian; keep it on the always-checked list
+        return None
+    eps = 1e-9
+    return min_lon - eps, min_lat - eps, max_lon + eps, max_lat + eps
+
+
+class CircleZone:
+    """Compiled POINT geozone: center in degrees and radians, cos(lat) and radius in meters."""
+
+    __slots__ = ("name", "lat", "lon", "phi", "cos_phi", "radius", "bbox")
+
+    def __init__(self, name: str, lat: float, lon: float, radius: float):
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.phi = math.radians(lat)
+        self.cos_phi = math.cos(self.phi)
+        self.radius = radius
+        self.bbox: Optional[BBox] = _circle_bbox(lat, lon, radius)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        # Same arithmetic as haversine_m(), with the center terms precomputed
+        dphi = math.radians(self.lat - lat)
+        dlambda = math.radians(self.lon - lon)
+        a = math.sin(dphi/2)**2 + math.cos(math.radians(lat)) * self.cos_phi * math.sin(dlambda/2)**2
+        return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a)) <= self.radius
+
+    def contains_many(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        return haversine_m_np(lats, lons, self.lat, self.lon) <= self.radius
+
+
+SLAB_MIN_VERTICES = 32      # rings smaller than this are scanned linearly
+SLAB_MAX_FILL = 32          # give up on slabs if they hold more than this many edges per vertex
+
+
+def _edge_x(xs: array, ys: array, e: int, y: float) -> float:
+    # x where edge e -> e+1 crosses the horizontal line at y (same formula as point_in_polygon)
+    n = len(xs)
+    x1, y1 = xs[e], ys[e]
+    x2, y2 = xs[(e + 1) % n], ys[(e + 1) % n]
+    return (x2 - x1) * (y - y1) / (y2 - y1 + 1e-15) + x1
+
+
+class Ring:
+    """
+    One closed ring as lon/lat array('d') buffers with its bbox.
+
+    Large rings also get an edge-slab table, built on the first scalar query: the distinct
+    vertex latitudes split the plane into horizontal slabs, and each slab stores the edges
+    spanning it ordered by x. A query binary-searches the slab, then the edges, so it costs
+    O(log n).
+    """
+
+    __slots__ = ("xs", "ys", "bbox", "slab_y", "slab_start", "slab_edges", "slabs_tried")
+
+    def __init__(self, coords: List[List[float]]):
+        self.xs = array("d", (float(p[0]) for p in coords))
+        self.ys = array("d", (float(p[1]) for p in coords))
+        self.bbox: BBox = (min(self.xs), min(self.ys), max(self.xs), max(self.ys))
+        self.slab_y: Optional[array] = None
+        self.slab_start: Optional[array] = None
+        self.slab_edges: Optional[array] = None
+        # small rings never get slabs
+        self.slabs_tried = len(self.xs) < SLAB_MIN_VERTICES
+
+    def _build_slabs(self) -> None:
+        self.slabs_tried = True
+        xs, ys = np.frombuffer(self.xs), np.frombuffer(self.ys)
+        n = len(xs)
+        x1, y1, x2, y2 = xs, ys, np.roll(xs, -1), np.roll(ys, -1)
+        slab_y = np.unique(ys)
+        # edge e spans slabs [pos(min y), pos(max y)); horizontal edges never cross
+        e = np.flatnonzero(y1 != y2)
+        first = np.searchsorted(slab_y, np.minimum(y1[e], y2[e]))
+        counts = np.searchsorted(slab_y, np.maximum(y1[e], y2[e])) - first
+        total = int(counts.sum())
+        if total > SLAB_MAX_FILL * n:
+            return
+        # one (slab, edge) pair per slab an edge spans
+        edge = np.repeat(e, counts)
+        slab = np.repeat(first, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        ex1, ey1, ex2, ey2 = x1[edge], y1[edge], x2[edge], y2[edge]
+
+        def edge_x(y: np.ndarray) -> np.ndarray:
+            # same formula as _edge_x()
+            return (ex2 - ex1) * (y - ey1) / (ey2 - ey1 + 1e-15) + ex1
+
+        lo, hi = slab_y[slab], slab_y[slab + 1]
+        order = np.lexsort((edge_x((lo + hi) / 2), slab))
+        edge, slab, lo, hi = edge[order], slab[order], lo[order], hi[order]
+        ex1, ey1, ex2, ey2 = ex1[order], ey1[order], ex2[order], ey2[order]
+        # edges of a simple ring never cross inside a slab; otherwise keep the linear scan
+        same = slab[1:] == slab[:-1]
+        for y in (lo + (hi - lo) * 1e-6, hi - (hi - lo) * 1e-6):
+            xs_at = edge_x(y)
+            if np.any(same & (xs_at[:-1] > xs_at[1:] + 1e-12)):
+                return
+        starts = np.zeros(len(slab_y), dtype=np.int64)
+        starts[1:] = np.cumsum(np.bincount(slab, minlength=len(slab_y) - 1))
+        self.slab_start = array("l", starts.tolist())
+        self.slab_edges = array("l", edge.tolist())
+        # set last: other threads only use the table once slab_y is there
+        self.slab_y = array("d", slab_y.tolist())
+
+    def contains(self, lat: float, lon: float) -> bool:
+        b = self.bbox
+        if not (b[0] <= lon <= b[2] and b[1] <= lat <= b[3]):
+            return False
+        x, y = lon, lat
+        if not self.slabs_tried:
+            self._build_slabs()
+        if self.slab_y is not None:
+            k = bisect_right(self.slab_y, y) - 1
+            if k < 0 or k >= len(self.slab_start) - 1:
+                return False
+            # crossings to the right of the point = edges after the first one with x < edge_x
+            lo, hi = self.slab_start[k], self.slab_start[k + 1]
+            end = hi
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if x < _edge_x(self.xs, self.ys, self.slab_edges[mid], y):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            return (end - lo) % 2 == 1
+        # Ray casting over edges (prev -> cur); same per-edge test as point_in_polygon()
+        inside = False
+        x1, y1 = self.xs[-1], self.ys[-1]
+        for x2, y2 in zip(self.xs, self.ys):
+            if ((y1 > y) != (y2 > y)) and (x < (x2 - x1) * (y - y1) / (y2 - y1 + 1e-15) + x1):
+                inside = not inside
+            x1, y1 = x2, y2
+        return inside
+
+    def contains_many(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        b = self.bbox
+        result = np.zeros(len(lats), dtype=bool)
+        sel = np.flatnonzero((lons >= b[0]) & (lons <= b[2]) & (lats >= b[1]) & (lats <= b[3]))
+        if not len(sel):
+            return result
+        xs, ys = np.frombuffer(self.xs), np.frombuffer(self.ys)
+        # the batch path gains nothing from slabs, so it only uses them once a scalar query built them
+        if self.slab_y is None:
+            result[sel] = points_in_ring(lats[sel], lons[sel], xs, ys)
+            return result
+        # Pair each point with only the edges of its own slab, then count crossings per point
+        x, y = lons[sel], lats[sel]
+        starts = np.frombuffer(self.slab_start, dtype=self.slab_start.typecode)
+        k = np.searchsorted(np.frombuffer(self.slab_y), y, side="right") - 1
+        ok = (k >= 0) & (k < len(starts) - 1)
+        x, y, k, sel = x[ok], y[ok], k[ok], sel[ok]
+        counts = starts[k + 1] - starts[k]
+        owner = np.repeat(np.arange(len(sel)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        e = np.frombuffer(self.slab_edges, dtype=self.slab_edges.typecode)[np.repeat(starts[k], counts) + offsets]
+        x1, y1 = xs[e], ys[e]
+        x2, y2 = xs[(e + 1) % len(xs)], ys[(e + 1) % len(xs)]
+        px, py = x[owner], y[owner]
+        crosses = ((y1 > py) != (y2 > py)) & (px < (x2 - x1) * (py - y1) / (y2 - y1 + 1e-15) + x1)
+        result[sel] = (np.bincount(owner, weights=crosses, minlength=len(sel)) % 2) == 1
+        return result
+
+
+class PolygonZone:
+    """Compiled POLYGON / MultiPolygon geozone: parts of (outer ring, *holes) plus the overall bbox."""
+
+    __slots__ = ("name", "parts", "bbox")
+
+    def __init__(self, name: str, parts: List[List[List[List[float]]]]):
+        self.name = name
+        self.parts: Tuple[Tuple[Ring, ...], ...] = tuple(
+            tuple(Ring(r) for r in rings if r) for rings in parts if rings and rings[0]
+        )
+        outer = [rings[0].bbox for rings in self.parts]
+        self.bbox: Optional[BBox] = (
+            min(b[0] for b in outer), min(b[1] for b in outer),
+            max(b[2] for b in outer), max(b[3] for b in outer),
+        ) if outer else None
+
+    def contains(self, lat: float, lon: float) -> bool:
+        for rings in self.parts:
+            if rings[0].contains(lat, lon) and not any(h.contains(lat, lon) for h in rings[1:]):
+                return True
+        return False
+
+    def contains_many(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        result = np.zeros(len(lats), dtype=bool)
+        for rings in self.parts:
+            part = rings[0].contains_many(lats, lons)
+            for h in rings[1:]:
+                if part.any():
+                    part &= ~h.contains_many(lats, lons)
+            result |= part
+        return result
+
+
+def polygon_parts(geometry: Dict) -> List[List[List[List[float]]]]:
+    """GeoJSON Polygon / MultiPolygon geometry -> list of polygons, each [outer ring, *holes]."""
+    coords = geometry.get("coordinates")
+    if not coords:
+        return []
+    multi = geometry.get("type") == "MultiPolygon" or (
+        bool(coords[0]) and bool(coords[0][0]) and isinstance(coords[0][0][0], (list, tuple))
+    )
+    return coords if multi else [coords]
+
+
+Zone = Union[CircleZone, PolygonZone]
+
+
+def compile_geozone(g: Dict) -> Optional[Zone]:
+    """Compile one list_geozones() item; None if it can never contain a point."""
+    gtype = g.get("type")
+    if gtype == "POINT":
+        circle = g.get("circle")
+        if not circle:
+            return None
+        c_lat, c_lon, r = circle.get("latitude"), circle.get("longitude"), circle.get("radius")
+        if c_lat is None or c_lon is None or r is None or float(r) < 0:
+            return None
+        return CircleZone(g.get("name"), float(c_lat), float(c_lon), float(r))
+    if gtype in ("POLYGON", "MULTIPOLYGON"):
+        geom = (g.get("feature") or {}).get("geometry") or {}
+        zone = PolygonZone(g.get("name"), polygon_parts(geom))
+        return zone if zone.parts else None
+    return None
+
+
+def compile_geozones(geozones: List[Union[Dict, Zone]]) -> List[Zone]:
+    """Compile list_geozones() output once; already compiled zones pass through, order is kept."""
+    zones: List[Zone] = []
+    for g in geozones:
+        z = g if isinstance(g, (CircleZone, PolygonZone)) else compile_geozone(g)
+        if z is not None:
+            zones.append(z)
+    return zones
+
+
+QUANT_PER_DEG = 100_000     # memo key resolution: 1e-5 degrees, about 1.1 m of latitude
+
+
+def quantize(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Pack in-range coordinates into one int64 key per ~1 m cell."""
+    qlat = np.rint(lats * QUANT_PER_DEG).astype(np.int64) + 90 * QUANT_PER_DEG
+    qlon = np.rint(lons * QUANT_PER_DEG).astype(np.int64) + 180 * QUANT_PER_DEG
+    return (qlat << 26) | qlon
+
+
+def dequantize(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Cell centres of quantize() keys."""
+    qlat = (keys >> 26) - 90 * QUANT_PER_DEG
+    qlon = (keys & ((1 << 26) - 1)) - 180 * QUANT_PER_DEG
+    return qlat / QUANT_PER_DEG, qlon / QUANT_PER_DEG
+
+
+class ZoneMemo:
+    """
+    Thread-safe LRU of point -> zone indices, keyed by (index version, quantize() key).
+
+    Depots and customer sites repeat across trips, so most endpoints land in a cell
+    classified before. Versions are unique per GeozoneIndex; a changed zone list means
+    a new index, so stale entries are never read and simply age out.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Tuple[int, int], Tuple[int, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, version: int, keys: List[int]) -> List[Optional[Tuple[int, ...]]]:
+        found: List[Optional[Tuple[int, ...]]] = []
+        with self._lock:
+            for k in keys:
+                zs = self._data.get((version, k))
+                if zs is not None:
+                    self._data.move_to_end((version, k))
+                found.append(zs)
+        return found
+
+    def record(self, hits: int, misses: int) -> None:
+        """Count points answered from the memo (or a duplicate in the same batch) vs. classified."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def put_many(self, version: int, items: Iterable[Tuple[int, Tuple[int, ...]]]) -> None:
+        with self._lock:
+            for k, zs in items:
+                self._data[(version, k)] = zs
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            probes = self.hits + self.misses
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / probes if probes else 0.0}
+
+
+# shared by every index unless one is built with memo=None
+ZONE_MEMO = ZoneMemo()
+_index_versions = count(1)
+
+
+class GeozoneIndex:
+    """
+    Grid index over compiled geozone bounding boxes, built once from list_geozones() output.
+
+    lookup() only runs the exact circle/polygon test on zones whose box contains
+    the point and returns the same names, in the same order, as geozones_for_point().
+    With a memo, points are classified at the centre of their ~1 m quantize() cell
+    and the result is remembered, so answers within a metre of a zone edge may differ.
+
+    excluding() returns a view with some zones switched off by a mask; it shares the
+    compiled geometry, the grid and the memo entries with this index.
+    """
+
+    @timed("geoutils.build_index")
+    def __init__(self, geozones: List[Union[Dict, Zone]], cell_deg: float = 0.01, max_cells_per_zone: int = 1024,
+                 memo: Optional[ZoneMemo] = ZONE_MEMO):
+        self.zones: List[Zone] = compile_geozones(geozones)
+        self.memo = memo
+        self.version = next(_index_versions)
+        # per-zone on/off mask set by excluding(); None means every zone is active
+        self.active: Optional[np.ndarray] = None
+        self.cell_deg = float(cell_deg)
+        # (cell_x, cell_y) -> ascending zone indices
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        # zones checked for every point: too large for the grid or without a usable box
+        self._always: List[int] = []
+        self._large: List[int] = []
+        self._np_cache: Optional[Dict[str, np.ndarray]] = None
+
+        for i, z in enumerate(self.zones):
+            bbox = z.bbox
+            if bbox is None:
+                self._always.append(i)
+                continue
+            x0, y0 = self._cell(bbox[0], bbox[1])
+            x1, y1 = self._cell(bbox[2], bbox[3])
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > max_cells_per_zone:
+                self._large.append(i)
+                continue
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self._cells.setdefault((cx, cy), []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+    def _cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lon / self.cell_deg), math.floor(lat / self.cell_deg)
+
+    def candidates(self, lat: float, lon: float) -> List[int]:
+        """Ascending indices of zones whose bounding box contains the point."""
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+            # outside the grid's domain (e.g. unnormalized longitude): test every zone
+            return list(range(len(self.zones)))
+
+        def in_box(i: int) -> bool:
+            b = self.zones[i].bbox
+            return b[0] <= lon <= b[2] and b[1] <= lat <= b[3]
+
+        found = [i for i in self._cells.get(self._cell(lon, lat), ()) if in_box(i)]
+        extra = [i for i in self._large if in_box(i)] + self._always
+        if extra:
+            found = sorted(found + extra)
+        return found
+
+    def excluding(self, names: Iterable[str]) -> "GeozoneIndex":
+        """View of this index with the named zones switched off (geometry, grid and memo are shared)."""
+        names = set(names)
+        self._batch_arrays()  # build once here rather than separately in every view
+        view = copy.copy(self)
+        view.active = np.array([z.name not in names for z in self.zones], dtype=bool)
+        return view
+
+    def _names(self, found: Iterable[int]) -> List[str]:
+        active = self.active
+        return [self.zones[i].name for i in found if active is None or active[i]]
+
+    def lookup(self, lat: Optional[float], lon: Optional[float]) -> List[str]:
+        """Return geozone names that contain the point."""
+        if lat is None or lon is None:
+            return []
+        zones = self.zones
+        if self.memo is None or not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+            return self._names(i for i in self.candidates(lat, lon) if zones[i].contains(lat, lon))
+        key = int(quantize(np.array([lat]), np.array([lon]))[0])
+        found = self.memo.get_many(self.version, [key])[0]
+        if found is None:
+            qlat, qlon = (float(v[0]) for v in dequantize(np.array([key])))
+            found = tuple(i for i in self.candidates(qlat, qlon) if zones[i].contains(qlat, qlon))
+            self.memo.put_many(self.version, [(key, found)])
+            self.memo.record(0, 1)
+        else:
+            self.memo.record(1, 0)
+        return self._names(found)
+
+    def _batch_arrays(self) -> Dict[str, np.ndarray]:
+        if self._np_cache is None:
+            boxed = [i for i, z in enumerate(self.zones) if z.bbox is not None]
+            boxes = np.array([self.zones[i].bbox for i in boxed], dtype=float).reshape(-1, 4)
+            self._np_cache = {
+                "boxed": np.array(boxed, dtype=np.int64),
+                "min_lon": boxes[:, 0], "min_lat": boxes[:, 1],
+                "max_lon": boxes[:, 2], "max_lat": boxes[:, 3],
+                "always": np.array(self._always, dtype=np.int64),
+            }
+        return self._np_cache
+
+    def membership(self, lats: Sequence[Optional[float]], lons: Sequence[Optional[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sparse point x zone membership as (point_idx, zone_idx) arrays, sorted by point then zone.
+        None / NaN coordinates belong to no zone; excluded zones are skipped.
+        """
+        return self._membership(lats, lons, self.active)
+
+    def _membership(self, lats: Sequence[Optional[float]], lons: Sequence[Optional[float]],
+                    active: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        lat_arr = np.array([np.nan if v is None else v for v in lats], dtype=float)
+        lon_arr = np.array([np.nan if v is None else v for v in lons], dtype=float)
+        valid = np.isfinite(lat_arr) & np.isfinite(lon_arr)
+        in_domain = valid & (np.abs(lat_arr) <= 90.0) & (np.abs(lon_arr) <= 180.0)
+
+        pt_parts: List[np.ndarray] = []
+        zn_parts: List[np.ndarray] = []
+        tests = 0
+
+        def add(i: int, pts: np.ndarray) -> None:
+            nonlocal tests
+            if active is not None and not active[i]:
+                return
+            tests += len(pts)
+            hit = pts[self.zones[i].contains_many(lat_arr[pts], lon_arr[pts])]
+            if len(hit):
+                pt_parts.append(hit)
+                zn_parts.append(np.full(len(hit), i, dtype=np.int64))
+
+        arrs = self._batch_arrays()
+        # Sort in-domain points by latitude so each zone box becomes a contiguous slice
+        pts = np.flatnonzero(in_domain)
+        order = pts[np.argsort(lat_arr[pts], kind="stable")]
+        sorted_lat = lat_arr[order]
+        lo = np.searchsorted(sorted_lat, arrs["min_lat"], side="left")
+        hi = np.searchsorted(sorted_lat, arrs["max_lat"], side="right")
+        for k in np.flatnonzero(hi > lo).tolist():
+            cand = order[lo[k]:hi[k]]
+            cand_lon = lon_arr[cand]
+            cand = cand[(cand_lon >= arrs["min_lon"][k]) & (cand_lon <= arrs["max_lon"][k])]
+            if len(cand):
+                add(int(arrs["boxed"][k]), cand)
+        for i in arrs["always"].tolist():
+            if len(pts):
+                add(i, pts)
+
+        # Points outside the grid's domain are tested against every zone
+        outside = np.flatnonzero(valid & ~in_domain)
+        if len(outside):
+            for i in range(len(self.zones)):
+                add(i, outside)
+
+        # exact point-in-zone tests run after the bounding-box filter
+        incr("geoutils.zone_tests", tests)
+        if not pt_parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        pt_idx = np.concatenate(pt_parts)
+        zn_idx = np.concatenate(zn_parts)
+        srt = np.lexsort((zn_idx, pt_idx))
+        return pt_idx[srt], zn_idx[srt]
+
+    @timed("geoutils.lookup_many")
+    def lookup_many(self, lats: Sequence[Optional[float]], lons: Sequence[Optional[float]]) -> List[List[str]]:
+        """Batch lookup(): one list of zone names per point."""
+        incr("geoutils.points", len(lats))
+        result: List[List[str]] = [[] for _ in range(len(lats))]
+        if self.memo is None:
+            pt_idx, zn_idx = self.membership(lats, lons)
+            for p, z in zip(pt_idx.tolist(), zn_idx.tolist()):
+                result[p].append(self.zones[z].name)
+            return result
+
+        lat_arr = np.array([np.nan if v is None else v for v in lats], dtype=float)
+        lon_arr = np.array([np.nan if v is None else v for v in lons], dtype=float)
+        with np.errstate(invalid="ignore"):
+            in_domain = (np.abs(lat_arr) <= 90.0) & (np.abs(lon_arr) <= 180.0)
+
+        # Off-grid points are rare: classify them exactly, without the memo
+        rest = np.flatnonzero(~in_domain & np.isfinite(lat_arr) & np.isfinite(lon_arr))
+        if len(rest):
+            pt_idx, zn_idx = self.membership(lat_arr[rest].tolist(), lon_arr[rest].tolist())
+            for p, z in zip(rest[pt_idx].tolist(), zn_idx.tolist()):
+                result[p].append(self.zones[z].name)
+
+        pts = np.flatnonzero(in_domain)
+        if not len(pts):
+            return result
+        # One memo probe per distinct cell; only cells not seen before are classified.
+        # The memo holds unmasked results, so views with other exclusions share it.
+        keys, inverse = np.unique(quantize(lat_arr[pts], lon_arr[pts]), return_inverse=True)
+        found = self.memo.get_many(self.version, keys.tolist())
+        missing = [k for k, zs in enumerate(found) if zs is None]
+        if missing:
+            new_keys = keys[missing]
+            qlat, qlon = dequantize(new_keys)
+            pt_idx, zn_idx = self._membership(qlat.tolist(), qlon.tolist(), None)
+            fresh: List[List[int]] = [[] for _ in missing]
+            for p, z in zip(pt_idx.tolist(), zn_idx.tolist()):
+                fresh[p].append(z)
+            for k, zs in zip(missing, fresh):
+                found[k] = tuple(zs)
+            self.memo.put_many(self.version, zip(new_keys.tolist(), (found[k] for k in missing)))
+        self.memo.record(len(pts) - len(missing), len(missing))
+        incr("geoutils.memo_hits", len(pts) - len(missing))
+        incr("geoutils.memo_misses", len(missing))
+        names = [self._names(zs) for zs in found]
+        for p, k in zip(pts.tolist(), inverse.tolist()):
+            result[p] = list(names[k])
+        return result
+
+
+def geozones_for_points(lats: Sequence[Optional[float]], lons: Sequence[Optional[float]],
+                        geozones: Union[List[Dict], GeozoneIndex]) -> List[List[str]]:
+    """Batch version of geozones_for_point(): classify many points in one vectorized pass."""
+    if not isinstance(geozones, GeozoneIndex):
+        # Throwaway index: exact like geozones_for_point(), and nothing left in the shared memo
+        geozones = GeozoneIndex(geozones, memo=None)
+    return geozones.lookup_many(lats, lons)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from fm_api import FmClient, get_client
+from geoutils import GeozoneIndex, Zone, compile_geozone
+
+logger = logging.getLogger("logbook.geozones")
+
+# Keys that carry geometry; everything else is part of a zone's light signature
+_GEOMETRY_KEYS = ("circle", "feature", "geometry")
+
+
+def _light_hash(item: Dict[str, Any]) -> str:
+    light = {k: v for k, v in item.items() if k not in _GEOMETRY_KEYS}
+    return hashlib.sha1(json.dumps(light, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class GeozoneCatalog:
+    """One account's geozones: raw items, compiled zones and the spatial index built over them."""
+
+    def __init__(self,
+                 items: Iterable[Dict[str, Any]],
+                 compiled: Optional[Dict[Any, Optional[Zone]]] = None,
+                 hashes: Optional[Dict[Any, str]] = None):
+        compiled = compiled or {}
+        self.items: List[Dict[str, Any]] = []
+        self._by_id: Dict[Any, Optional[Zone]] = {}
+        zones: List[Zone] = []
+        # Compiling as items arrive overlaps with the prefetch of the next page
+        for g in items:
+            self.items.append(g)
+            zid = g.get("id")
+            z = compiled[zid] if zid is not None and zid in compiled else compile_geozone(g)
+            if zid is not None:
+                self._by_id[zid] = z
+            if z is not None:
+                zones.append(z)
+        self.zones = zones
+        self.index = GeozoneIndex(zones)
+        # Per-zone light signatures, compared against the next light listing
+        self.hashes: Dict[Any, str] = hashes if hashes is not None else {g.get("id"): _light_hash(g) for g in self.items}
+        self.signature = hashlib.sha1("".join(sorted(map(str, self.hashes.items()))).encode()).hexdigest()
+        self.loaded_at = self.validated_at = time.monotonic()
+
+
+class GeozoneCache:
+    """
+    Process-wide geozone cache shared by every session using the same API key.
+
+    After `ttl` seconds a catalog is revalidated with a light listing (no geometry); only
+    zones whose light fields changed are refetched with geometry. After `max_age` seconds,
+    or when too many zones changed, the catalog is reloaded in full. If that fails, the
+    cached catalog keeps being served and the refresh is retried after `retry_after` seconds.
+    """
+
+    def __init__(self, ttl: float = 900.0, max_age: float = 86400.0, max_changed: int = 50,
+                 retry_after: float = 60.0):
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.max_age = max_age
+        self.max_changed = max_changed
+        self._catalogs: Dict[str, GeozoneCatalog] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+    def get(self, api_key: str, client: Optional[FmClient] = None) -> GeozoneCatalog:
+        key = self._key(api_key)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        # Per-key lock: concurrent sessions wait for one load instead of all hitting the API
+        with lock:
+            client = client or get_client(api_key)
+            cat = self._catalogs.get(key)
+            now = time.monotonic()
+            if cat is None:
+                cat = GeozoneCatalog(client.iter_geozones())
+            elif now - cat.loaded_at >= self.max_age or now - cat.validated_at >= self.ttl:
+                expired = now - cat.loaded_at >= self.max_age
+                try:
+                    cat = GeozoneCatalog(client.iter_geozones()) if expired else self._revalidate(client, cat)
+                except Exception:
+                    # A stale catalog beats no report: keep it and retry after retry_after seconds
+                    logger.warning("Geozone refresh failed; serving the cached catalog", exc_info=True)
+                    cat.validated_at = now - self.ttl + self.retry_after
+                    if expired:
+                        cat.loaded_at = now - self.max_age + self.retry_after
+            self._catalogs[key] = cat
+            return cat
+
+    def _revalidate(self, client: FmClient, cat: GeozoneCatalog) -> GeozoneCatalog:
+        light = client.list_geozones(include_geometry=False)
+        hashes = {g.get("id"): _light_hash(g) for g in light}
+        changed = [zid for zid, h in hashes.items() if cat.hashes.get(zid) != h]
+        if not changed and len(hashes) == len(cat.hashes):
+            cat.validated_at = time.monotonic()
+            return cat
+        # From here on compare against light listings, whatever extra fields the full items carry
+        if None in hashes or len(changed) > self.max_changed:
+            return GeozoneCatalog(client.iter_geozones(), hashes=hashes)
+        try:
+            fresh = {zid: client.get_geozone(zid) for zid in changed}
+        except Exception:
+            return GeozoneCatalog(client.iter_geozones(), hashes=hashes)
+        old = {g.get("id"): g for g in cat.items}
+        items = [fresh.get(g.get("id")) or old.get(g.get("id")) or g for g in light]
+        reuse = {zid: z for zid, z in cat._by_id.items() if zid not in fresh}
+        new = GeozoneCatalog(items, reuse, hashes)
+        new.loaded_at = cat.loaded_at
+        return new
+
+    def invalidate(self, api_key: Optional[str] = None) -> None:
+        with self._lock:
+            if api_key is None:
+                self._catalogs.clear()
+            else:
+                self._catalogs.pop(self._key(api_key), None)
+
+
+_default_cache = GeozoneCache()
+
+
+def geozone_catalog(api_key: str) -> GeozoneCatalog:
+    """Cached geozone catalog for an API key from the process-wide GeozoneCache."""
+    return _default_cache.get(api_key)
@@ -0,0 +1,181 @@
+"""
+Process-wide background jobs for long report runs.
+
+The app submits each RUN as a job and keeps only the job id in its session. The work runs on a
+shared thread pool, so reruns and widget changes neither cancel nor repeat it, and several
+reports can be queued at once. Jobs publish progress counters (pages fetched, vehicles done) and
+partial results that the UI polls; finished jobs keep their result until they are pruned.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import METRICS, Profiler, Snapshot, incr, log_metrics, since, timed
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancel() was requested (see Job.check_cancelled())."""
+
+
+class Job:
+    """One background run: status, progress counters, partial results and the final result."""
+
+    def __init__(self, label: str, params: Optional[Dict[str, Any]] = None, profile: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        # what the job was asked to do; the app compares these to avoid queueing the same run twice
+        self.params = params or {}
+        self.status = QUEUED
+        self.progress: Dict[str, Any] = {}
+        # results available before the job finishes, e.g. one entry per vehicle done
+        self.partial: Dict[Any, Any] = {}
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+        # stage timers and counters recorded while the job ran (see metrics.since())
+        self.metrics: Optional[Snapshot] = None
+        # profiler kind to run the job under, and then (kind, report)
+        self.profile_kind = profile
+        self.profile: Optional[Tuple[str, str]] = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def update(self, **progress: Any) -> None:
+        with self._lock:
+            self.progress.update(progress)
+
+    def add(self, key: str, n: int = 1) -> None:
+        """Increment a progress counter (safe from the job's own worker threads)."""
+        with self._lock:
+            self.progress[key] = self.progress.get(key, 0) + n
+
+    def set_partial(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self.partial[key] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Status, progress and partial results as of now, for the UI to poll."""
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "id": self.id, "label": self.label, "status": self.status, "progress": dict(self.progress),
+                "partial": dict(self.partial), "elapsed_s": end - (self.started or end),
+            }
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        # not started yet: drop it from the queue right away
+        if self.future is not None and self.future.cancel():
+            self._finish(CANCELLED)
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finishes or `timeout` passes; True if it finished."""
+        return self._done.wait(timeout)
+
+    def _finish(self, status: str, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.status, self.result, self.error = status, result, error
+            self.finished_at = time.time()
+        self._done.set()
+
+
+class JobStore:
+    """Jobs by id, run on a bounded thread pool; finished jobs are dropped after `ttl` seconds."""
+
+    def __init__(self, max_workers: int = 2, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="logbook-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, label: str, fn: Callable[..., Any], *args: Any,
+               params: Optional[Dict[str, Any]] = None, profile: Optional[str] = None, **kwargs: Any) -> Job:
+        """
+        Queue fn(job, *args, **kwargs); its return value becomes job.result. With `profile`
+        (a metrics.available_profilers() kind) the job's worker thread runs under that profiler.
+        """
+        self.prune()
+        job = Job(label, params, profile)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job, fn, args, kwargs)
+        incr("jobs.submitted")
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        if job._cancel.is_set():
+            job._finish(CANCELLED)
+            return
+        with job._lock:
+            job.status, job.started = RUNNING, time.time()
+        before = METRICS.snapshot()
+        profiler = Profiler(job.profile_kind) if job.profile_kind else None
+        if profiler is not None:
+            try:
+                profiler.start()
+            except ValueError:  # another profiler is already active
+                profiler = None
+        try:
+            with timed("jobs.run"):
+                result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            status, result, error = CANCELLED, None, None
+        except Exception as e:
+            status, result, error = FAILED, None, e
+        else:
+            status, error = DONE, None
+        finally:
+            if profiler is not None:
+                job.profile = (profiler.kind, profiler.stop())
+        # set before _finish(), so anyone woken by wait() sees them
+        job.metrics = since(before, METRICS.snapshot())
+        log_metrics("job", job.metrics, job=job.id, label=job.label, status=status)
+        job._finish(status, result, error)
+        incr(f"jobs.{job.status}")
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def jobs(self, ids: Optional[List[str]] = None) -> List[Job]:
+        """Known jobs (optionally only these ids, in that order); pruned ids are skipped."""
+        with self._lock:
+            if ids is None:
+                return list(self._jobs.values())
+            return [self._jobs[i] for i in ids if i in self._jobs]
+
+    def prune(self) -> None:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id in [i for i, j in self._jobs.items() if j.finished and (j.finished_at or 0) < cutoff]:
+                del self._jobs[job_id]
+
+
+_default_store: Optional[JobStore] = None
+_default_lock = threading.Lock()
+
+
+def default_store() -> JobStore:
+    """Process-wide JobStore shared by all app sessions; LOGBOOK_JOB_WORKERS sets its pool size."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = JobStore(max_workers=int(os.environ.get("LOGBOOK_JOB_WORKERS", "2")))
+        return _default_store
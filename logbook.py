@@ -0,0 +1,150 @@
+"""
+Headless logbook reports for many vehicles, e.g. the nightly month-end run for the whole fleet:
+
+    python logbook.py --from 2025-01-01 --to 2025-01-31 --out reports/            # every vehicle
+    python logbook.py --from 2025-01-01 --to 2025-01-31 --vehicle 123 --vehicle "Van 7" --merge --format parquet
+
+The API key comes from --api-key or the FM_API_KEY environment variable. Each vehicle is one task
+on a process pool and gets its own CSV / Parquet / XLSX file, streamed row by row (see export.py);
+the same settings as the Streamlit app apply.
+"""
+import argparse
+import datetime as dt
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import fm_api
+from fm_api import list_geozones, list_objects
+from geoutils import GeozoneIndex, Zone, compile_geozones
+from export import available_formats, export_rows
+from metrics import METRICS, configure_from_env, log_metrics, since
+from report import Totals, fetch_vehicle_trips, format_row, iter_report_records
+from transforms import TripTable
+
+# Per worker process, set up once by _init_worker()
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(api_key: str, zones: List[Zone], excluded: List[str], rate: float, burst: int) -> None:
+    configure_from_env()  # spawned workers: metrics logging follows the parent's environment
+    # This worker's share of the run's request budget
+    fm_api.set_rate_limit(rate, burst)
+    # Workers index the zones the parent compiled instead of each downloading and compiling them
+    index = GeozoneIndex(zones)
+    _worker["api_key"] = api_key
+    _worker["index"] = index.excluding(excluded) if excluded else index
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") or "vehicle"
+
+
+def run_vehicle(vehicle_id: str, vehicle_name: str, opts: Dict[str, Any]) -> Tuple[str, int, Dict[str, str]]:
+    """Build and write one vehicle's report; returns (output path, row count, totals)."""
+    tz = ZoneInfo(opts["tz"])
+    before = METRICS.snapshot()
+    trips = fetch_vehicle_trips(_worker["api_key"], vehicle_id, opts["from_dt"], opts["to_dt"])
+    table = TripTable.from_trips(trips).merge_short(opts["short_trip_minutes"], opts["stay_gap_minutes"])
+    records = iter_report_records(table, _worker["index"], opts["merge"], opts["raw"])
+    totals = Totals()
+
+    # the id keeps vehicles whose names map to the same file name apart
+    name = f"{_safe_name(vehicle_name)}_{_safe_name(str(vehicle_id))}_{opts['label']}.{opts['format']}"
+    path = os.path.join(opts["out"], name)
+    with open(path, "wb") as out:
+        # Totals add up the numbers; only the written rows are formatted
+        export_rows((format_row(rec, tz, html=False) for rec in totals.track(records)), opts["format"], out)
+    log_metrics("vehicle_report", since(before, METRICS.snapshot()), vehicle=vehicle_id, rows=totals.rows)
+    return path, totals.rows, totals.formatted(opts["raw"])
+
+
+def resolve_vehicles(objects: List[Dict[str, Any]], wanted: Optional[List[str]]) -> List[Tuple[str, str]]:
+    """(id, name) pairs for --vehicle values (ids or names); every object when none are given."""
+    if not wanted:
+        return [(o["id"], o["name"]) for o in objects]
+    by_id = {str(o["id"]): o for o in objects}
+    by_name = {o["name"]: o for o in objects}
+    out = []
+    for w in wanted:
+        o = by_id.get(w) or by_name.get(w)
+        if o is None:
+            raise SystemExit(f"Unknown vehicle: {w}")
+        out.append((o["id"], o["name"]))
+    return out
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="logbook", description="Build logbook reports for one or more vehicles.")
+    p.add_argument("--api-key", default=os.environ.get("FM_API_KEY"), help="defaults to $FM_API_KEY")
+    p.add_argument("--from", dest="from_date", required=True, type=dt.date.fromisoformat, help="first day, YYYY-MM-DD")
+    p.add_argument("--to", dest="to_date", required=True, type=dt.date.fromisoformat, help="last day, YYYY-MM-DD")
+    p.add_argument("--vehicle", action="append", help="vehicle id or name; repeat for several (default: all)")
+    p.add_argument("--tz", default="Europe/Vienna", help="time zone of the date range and report times")
+    p.add_argument("--merge", action="store_true", help="merge trips into zone-to-zone segments")
+    p.add_argument("--raw", action="store_true", help="keep 3 decimals on distances")
+    p.add_argument("--short-trip-minutes", type=int, default=0, help="merge trips shorter than this (0 = off)")
+    p.add_argument("--stay-gap-minutes", type=int, default=10, help="merge if the stay between trips is <= this")
+    p.add_argument("--exclude", action="append", default=[], help="geozone name to ignore; repeatable")
+    p.add_argument("--format", choices=available_formats(), default="csv",
+                   help="parquet needs pyarrow, xlsx needs xlsxwriter or openpyxl")
+    p.add_argument("--out", default=".", help="output directory")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parallel vehicle reports")
+    p.add_argument("--rate", type=float, default=fm_api.RATE_LIMIT,
+                   help="API requests per second for the whole run, shared by the workers")
+    p.add_argument("--metrics-log", action="store_true",
+                   help="log per-vehicle stage timings and counters as JSON lines on stderr")
+    args = p.parse_args(argv)
+    if not args.api_key:
+        p.error("an API key is required (--api-key or FM_API_KEY)")
+    if args.rate <= 0:
+        p.error("--rate must be positive")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.metrics_log:
+        os.environ["LOGBOOK_METRICS_LOG"] = "1"
+    configure_from_env()
+    tz = ZoneInfo(args.tz)
+    # Same range convention as the app: first day 00:00 to last day 23:59, local time
+    from_dt = dt.datetime.combine(args.from_date, dt.time(0, 0)).replace(tzinfo=tz).astimezone(dt.timezone.utc)
+    to_dt = dt.datetime.combine(args.to_date, dt.time(23, 59)).replace(tzinfo=tz).astimezone(dt.timezone.utc)
+
+    vehicles = resolve_vehicles(list_objects(args.api_key), args.vehicle)
+    zones = compile_geozones(list_geozones(args.api_key))
+    os.makedirs(args.out, exist_ok=True)
+    opts = {
+        "from_dt": from_dt, "to_dt": to_dt, "tz": args.tz, "merge": args.merge, "raw": args.raw,
+        "short_trip_minutes": args.short_trip_minutes, "stay_gap_minutes": args.stay_gap_minutes,
+        "format": args.format, "out": args.out, "label": f"{args.from_date}_{args.to_date}",
+    }
+
+    failed = 0
+    workers = max(1, min(args.workers, len(vehicles) or 1))
+    # every worker has its own client, so each gets an equal slice of the request budget
+    rate, burst = args.rate / workers, max(1, fm_api.RATE_BURST // workers)
+    # spawn: workers must not inherit the parent's open HTTP connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker,
+                             initargs=(args.api_key, zones, args.exclude, rate, burst)) as pool:
+        futures = {pool.submit(run_vehicle, vid, name, opts): name for vid, name in vehicles}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                path, n_rows, totals = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"{name}: FAILED: {e}", file=sys.stderr)
+                continue
+            print(f"{name}: {n_rows} rows, {totals['distance']} km, travel {totals['travel']}, "
+                  f"stop {totals['stay']} -> {path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
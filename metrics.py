@@ -0,0 +1,220 @@
+"""
+Process-wide stage timers and counters for the report pipeline.
+
+    with timed("fm_api.request"):
+        ...
+    incr("geoutils.zone_tests", n)
+
+fm_api, trip_cache, geoutils, transforms, report, export and app.py record into METRICS. The app
+shows the numbers of each run in its sidebar; they can also go out as JSON log lines (logger
+"logbook.metrics") or as Prometheus text on a small HTTP endpoint. Profiler wraps one run in
+cProfile or, if installed, pyinstrument.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import pyinstrument
+except ImportError:  # optional
+    pyinstrument = None
+
+logger = logging.getLogger("logbook.metrics")
+
+Snapshot = Dict[str, Dict[str, Any]]
+
+
+class Metrics:
+    """Thread-safe counters and timers (calls, total and max seconds per stage)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        # name -> [calls, total seconds, max seconds]
+        self._timers: Dict[str, List[float]] = {}
+
+    def incr(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            t = self._timers.get(name)
+            if t is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                t[0] += 1
+                t[1] += seconds
+                t[2] = max(t[2], seconds)
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        """Time the block (or, used as a decorator, each call) under `name`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timers": {k: {"calls": int(c), "total_s": s, "max_s": m} for k, (c, s, m) in self._timers.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+
+def since(before: Snapshot, after: Snapshot) -> Snapshot:
+    """
+    What changed between two snapshots, e.g. one app run (calls and total seconds per timer).
+    Other sessions running at the same time are counted too.
+    """
+    counters = {k: v - before["counters"].get(k, 0) for k, v in after["counters"].items()}
+    timers = {}
+    for k, t in after["timers"].items():
+        prev = before["timers"].get(k, {"calls": 0, "total_s": 0.0})
+        if t["calls"] > prev["calls"]:
+            timers[k] = {"calls": t["calls"] - prev["calls"], "total_s": t["total_s"] - prev["total_s"]}
+    return {"counters": {k: v for k, v in counters.items() if v}, "timers": timers}
+
+
+METRICS = Metrics()
+incr = METRICS.incr
+timed = METRICS.timed
+
+
+# --- exporters ---
+
+def _prom_name(name: str) -> str:
+    return "logbook_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def prometheus_text(snap: Optional[Snapshot] = None) -> str:
+    """Snapshot in the Prometheus text exposition format (counters as *_total, timers as summaries)."""
+    snap = snap or METRICS.snapshot()
+    lines: List[str] = []
+    for name, value in sorted(snap["counters"].items()):
+        metric = _prom_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+    if snap["timers"]:
+        lines.append("# TYPE logbook_stage_seconds summary")
+        for name, t in sorted(snap["timers"].items()):
+            lines.append(f'logbook_stage_seconds_count{{stage="{name}"}} {t["calls"]}')
+            lines.append(f'logbook_stage_seconds_sum{{stage="{name}"}} {t["total_s"]:.6f}')
+        lines.append("# TYPE logbook_stage_seconds_max gauge")
+        for name, t in sorted(snap["timers"].items()):
+            lines.append(f'logbook_stage_seconds_max{{stage="{name}"}} {t["max_s"]:.6f}')
+    return "\n".join(lines) + "\n"
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def serve_prometheus(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve prometheus_text() at http://host:port/metrics from a daemon thread (once per process)."""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        _server = ThreadingHTTPServer((host, port), Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+def log_metrics(event: str, snap: Snapshot, **fields: Any) -> None:
+    """One JSON log line with the snapshot and any extra fields (vehicle, rows, ...)."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, **fields, **snap}, default=str, separators=(",", ":")))
+
+
+def configure_from_env() -> None:
+    """
+    LOGBOOK_METRICS_PORT=9108 starts the Prometheus endpoint; LOGBOOK_METRICS_LOG=1 sends the
+    JSON log lines to stderr. Safe to call on every app rerun.
+    """
+    port = os.environ.get("LOGBOOK_METRICS_PORT")
+    if port:
+        serve_prometheus(int(port), os.environ.get("LOGBOOK_METRICS_HOST", "127.0.0.1"))
+    if os.environ.get("LOGBOOK_METRICS_LOG") and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+# --- profiling ---
+
+def available_profilers() -> List[str]:
+    return ["cProfile"] + (["pyinstrument"] if pyinstrument is not None else [])
+
+
+class Profiler:
+    """
+    Opt-in profile of one run on the calling thread (fetch worker threads are not included).
+
+        prof = Profiler("cProfile"); prof.start(); ...; text = prof.stop()
+    """
+
+    def __init__(self, kind: str = "cProfile", limit: int = 40):
+        if kind not in available_profilers():
+            raise ValueError(f"Profiler not available: {kind}")
+        self.kind = kind
+        self.limit = limit
+        self._prof: Any = None
+        self.text: Optional[str] = None
+
+    def start(self) -> None:
+        self._prof = cProfile.Profile() if self.kind == "cProfile" else pyinstrument.Profiler()
+        if self.kind == "cProfile":
+            self._prof.enable()
+        else:
+            self._prof.start()
+
+    def stop(self) -> str:
+        """Stop and return the report: top `limit` functions by cumulative time, or pyinstrument's tree."""
+        if self.kind == "cProfile":
+            self._prof.disable()
+            out = io.StringIO()
+            pstats.Stats(self._prof, stream=out).sort_stats("cumulative").print_stats(self.limit)
+            return out.getvalue()
+        self._prof.stop()
+        return self._prof.output_text()
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.text = self.stop()
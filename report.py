@@ -0,0 +1,191 @@
+"""Logbook report building shared by the Streamlit app (app.py) and the batch CLI (logbook.py)."""
+import datetime as dt
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from fm_api import PageCallback, find_trips, find_trips_many, get_client
+from geoutils import GeozoneIndex
+from jobs import Job
+from metrics import incr, timed
+from transforms import TripTable, epoch_to_dt, fmt_hms, iter_trip_rows
+from trip_cache import TripCache, default_cache
+
+REPORT_COLUMNS = ["Departure", "Departure at", "Arrival", "Arrival at", "Distance (km)", "Duration", "Stay (hh:mm:ss)"]
+# Numeric report records (see iter_report_records()); format_row() turns one into REPORT_COLUMNS
+RECORD_COLUMNS = ["dep_zones", "dep_address", "dep_ts", "arr_zones", "arr_address", "arr_ts", "km", "duration_s",
+                  "stay_s"]
+
+
+def round_nearest_int(x: float | int | None) -> int:
+    if x is None:
+        return 0
+    return int(math.floor(float(x) + 0.5))
+
+def _value(x: Any) -> Any:
+    # None for missing values, including the NaN a DataFrame puts in their place
+    return None if x is None or (isinstance(x, float) and math.isnan(x)) else x
+
+
+def fetch_vehicle_trips(api_key: str, vehicle_id: str, from_dt: dt.datetime, to_dt: dt.datetime,
+                        cache: Optional[TripCache] = None, on_page: Optional[PageCallback] = None,
+                        max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    One vehicle's trips; only the parts of the range not in the local trip cache hit the API.
+    max_concurrency caps how many of a long range's slices are fetched at once.
+    """
+    def fetch(gap_from: dt.datetime, gap_to: dt.datetime) -> List[Dict[str, Any]]:
+        # Long ranges are paginated as parallel weekly slices (up to 8)
+        range_days = (gap_to - gap_from).total_seconds() / 86400
+        return find_trips(api_key, gap_from, gap_to, vehicle_id, slices=max(1, min(8, int(range_days // 7))),
+                          max_concurrency=max_concurrency, on_page=on_page)
+
+    return (cache or default_cache()).get_trips(vehicle_id, from_dt, to_dt, fetch)
+
+
+def fetch_fleet_trips(api_key: str, vehicle_ids: Iterable[str], from_dt: dt.datetime, to_dt: dt.datetime,
+                      max_concurrency: int = 8, on_page: Optional[PageCallback] = None,
+                      ) -> Iterator[Tuple[str, Union[List[Dict[str, Any]], Exception]]]:
+    """
+    fetch_vehicle_trips() for many vehicles: fm_api.find_trips_many() through the trip cache.
+    Yields (vehicle_id, trips or the exception) in completion order.
+    """
+    vehicle_ids = list(vehicle_ids)
+    workers = max(1, min(int(max_concurrency), len(vehicle_ids)))
+    # vehicles x slices in flight stays within the client's connection pool
+    slice_concurrency = max(1, get_client(api_key).pool_maxsize // workers)
+
+    def fetch(vehicle_id: str) -> List[Dict[str, Any]]:
+        return fetch_vehicle_trips(api_key, vehicle_id, from_dt, to_dt, on_page=on_page,
+                                   max_concurrency=slice_concurrency)
+
+    return find_trips_many(api_key, vehicle_ids, from_dt, to_dt, workers, return_exceptions=True, fetch=fetch)
+
+
+def load_trip_tables(job: Job, api_key: str, vehicle_ids: List[str], from_dt: dt.datetime, to_dt: dt.datetime,
+                     geozones: Optional[GeozoneIndex] = None) -> Dict[str, Union[TripTable, Exception]]:
+    """
+    Background job body for a RUN (see jobs.py): each vehicle's trips as a sorted TripTable, or the
+    exception that vehicle failed with. Vehicles are published to job.partial as they finish, with
+    their endpoints already classified against `geozones`; progress counts pages, trips and vehicles.
+    """
+    job.update(vehicles=len(vehicle_ids), vehicles_done=0, pages=0, trips=0)
+
+    def on_page(n_trips: int) -> None:
+        job.check_cancelled()
+        job.add("pages")
+        job.add("trips", n_trips)
+
+    tables: Dict[str, Union[TripTable, Exception]] = {}
+    for vid, trips in fetch_fleet_trips(api_key, vehicle_ids, from_dt, to_dt, on_page=on_page):
+        job.check_cancelled()
+        if isinstance(trips, Exception):
+            tables[vid] = trips
+        else:
+            table = tables[vid] = TripTable.from_trips(trips).sorted_by_start()
+            if geozones is not None:
+                table.endpoint_zones(geozones)  # memoized on the table's records for the render
+        job.set_partial(vid, tables[vid])
+        job.add("vehicles_done")
+    return tables
+
+
+def iter_report_records(trip_table: TripTable, geozones: GeozoneIndex, merge: bool,
+                        raw_mode: bool) -> Iterator[Dict[str, Any]]:
+    """
+    Numeric report records for one vehicle (RECORD_COLUMNS): zone-to-zone segments (merge=True)
+    or every trip, from the one pass of transforms.iter_trip_rows(). `km` is the distance as shown:
+    whole km unless raw_mode; segments are first rounded to 3 decimals, as they always were.
+    """
+    for row, segment in iter_trip_rows(trip_table, geozones):
+        rec = segment if merge else row
+        if rec is None:
+            continue
+        km = rec.pop("meters") / 1000.0
+        if merge or raw_mode:
+            km = round(km, 3)
+        rec["km"] = km if raw_mode else round_nearest_int(km)
+        yield rec
+
+
+def format_row(rec: Dict[str, Any], tz: ZoneInfo, html: bool = True) -> Dict[str, Any]:
+    """
+    One record as a display row (REPORT_COLUMNS): local times, "HH:MM:SS" durations and zone names
+    in front of the address, highlighted in red unless html=False (file exports).
+    """
+    out: Dict[str, Any] = {}
+    for side, place, at in (("dep", "Departure", "Departure at"), ("arr", "Arrival", "Arrival at")):
+        zones, address = rec[f"{side}_zones"], rec[f"{side}_address"] or ""
+        if zones:
+            names = ", ".join(zones)
+            address = f"<b style='color:red'>{names}</b> : {address}" if html else f"{names} : {address}"
+        ts = _value(rec[f"{side}_ts"])
+        out[place] = address
+        out[at] = epoch_to_dt(int(ts)).astimezone(tz).strftime("%Y-%m-%d %H:%M:%S") if ts is not None else ""
+    stay = _value(rec["stay_s"])
+    out["Distance (km)"] = rec["km"]
+    out["Duration"] = fmt_hms(rec["duration_s"])
+    out["Stay (hh:mm:ss)"] = fmt_hms(stay) if stay is not None else ""
+    return {c: out[c] for c in REPORT_COLUMNS}
+
+
+def iter_report_rows(trip_table: TripTable, geozones: GeozoneIndex, merge: bool, raw_mode: bool,
+                     tz: ZoneInfo, html: bool = True) -> Iterator[Dict[str, Any]]:
+    """iter_report_records() formatted one at a time, e.g. for exports."""
+    for rec in iter_report_records(trip_table, geozones, merge, raw_mode):
+        yield format_row(rec, tz, html)
+
+
+def build_report(trip_table: TripTable, geozones: GeozoneIndex, merge: bool, raw_mode: bool) -> pd.DataFrame:
+    """iter_report_records() as a DataFrame for on-screen display; format_rows() formats the visible page."""
+    with timed("report.build"):
+        df = pd.DataFrame(iter_report_records(trip_table, geozones, merge, raw_mode), columns=RECORD_COLUMNS)
+    incr("report.rows", len(df))
+    return df
+
+
+def format_rows(df: pd.DataFrame, tz: ZoneInfo, html: bool = True) -> pd.DataFrame:
+    """Display rows for (a slice of) a build_report() table."""
+    return pd.DataFrame([format_row(rec, tz, html) for rec in df.to_dict("records")], columns=REPORT_COLUMNS)
+
+
+def report_sums(df: pd.DataFrame) -> Tuple[float, int, int]:
+    """(distance km, travel seconds, stop seconds) summed over a build_report() table."""
+    # Distance: the table already contains rounded/raw values according to raw_mode
+    return float(df["km"].sum()), int(df["duration_s"].sum()), int(df["stay_s"].fillna(0).sum())
+
+
+def format_totals(distance_km: float, travel_s: int, stay_s: int, raw_mode: bool) -> Dict[str, str]:
+    return {
+        "distance": f"{distance_km:.3f}" if raw_mode else f"{round_nearest_int(distance_km)}",
+        "travel": fmt_hms(travel_s),
+        "stay": fmt_hms(stay_s),
+    }
+
+
+def report_totals(df: pd.DataFrame, raw_mode: bool) -> Dict[str, str]:
+    """Distance, travel time and stop time over the whole report, formatted for display."""
+    return format_totals(*report_sums(df), raw_mode)
+
+
+class Totals:
+    """report_sums() kept while records stream past, for exports that never hold the whole report."""
+
+    def __init__(self):
+        self.rows = 0
+        self.distance_km = 0.0
+        self.travel_s = 0
+        self.stay_s = 0
+
+    def track(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for rec in records:
+            self.rows += 1
+            self.distance_km += rec["km"]
+            self.travel_s += rec["duration_s"]
+            self.stay_s += rec["stay_s"] or 0
+            yield rec
+
+    def formatted(self, raw_mode: bool) -> Dict[str, str]:
+        return format_totals(self.distance_km, self.travel_s, self.stay_s, raw_mode)
@@ -0,0 +1,114 @@
+import json
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+import fm_api
+from fm_api import FmClient, RateLimiter
+
+
+class StubResponse:
+    def __init__(self, status_code: int, body: Any = None, headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = json.dumps(body)
+        self.content = self.text.encode()
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class StubSession:
+    """Stands in for requests.Session: hands out queued responses, the last one repeatedly."""
+
+    def __init__(self, *responses: StubResponse):
+        self.responses = list(responses)
+        self.calls: List[str] = []
+
+    def request(self, method: str, url: str, **kwargs: Any) -> StubResponse:
+        self.calls.append(method)
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> List[float]:
+    slept: List[float] = []
+    monkeypatch.setattr(fm_api.time, "sleep", slept.append)
+    return slept
+
+
+def client(*responses: StubResponse, **kwargs: Any) -> FmClient:
+    c = FmClient("key", base_url="http://fm.test", **kwargs)
+    c.session = StubSession(*responses)
+    return c
+
+
+def test_429_waits_retry_after(sleeps):
+    c = client(StubResponse(429, headers={"Retry-After": "7"}), StubResponse(200, [{"id": 1}]))
+    assert c.list_objects() == [{"id": 1}]
+    assert c.session.calls == ["GET", "GET"]
+    assert sleeps == [7.0]
+
+
+def test_retry_after_is_capped_by_backoff_max(sleeps):
+    c = client(StubResponse(429, headers={"Retry-After": "120"}), StubResponse(200, []), backoff_max=30.0)
+    assert c.list_objects() == []
+    assert sleeps == [30.0]
+
+
+def test_5xx_gives_up_after_max_retries(sleeps):
+    c = client(StubResponse(503, {"error": "busy"}), max_retries=3, backoff_base=0.5, backoff_max=30.0)
+    with pytest.raises(RuntimeError, match="503"):
+        c.list_objects()
+    assert len(c.session.calls) == 4
+    # full jitter within the exponential cap
+    assert len(sleeps) == 3
+    assert all(0 <= s <= 0.5 * 2 ** i for i, s in enumerate(sleeps))
+
+
+def test_non_retryable_4xx_fails_at_once(sleeps):
+    c = client(StubResponse(404, {"error": "not found"}))
+    with pytest.raises(RuntimeError, match="404"):
+        c.list_objects()
+    assert c.session.calls == ["GET"]
+    assert sleeps == []
+
+
+def test_post_is_not_retried_on_5xx(sleeps):
+    c = client(StubResponse(502), StubResponse(200, {}))
+    assert c._post("http://fm.test/x", {}).status_code == 502
+    assert c.session.calls == ["POST"]
+    assert sleeps == []
+
+
+def test_each_api_key_has_its_own_rate_limiter(monkeypatch):
+    monkeypatch.setattr(fm_api, "_clients", {})
+    monkeypatch.setattr(fm_api, "RATE_LIMIT", 10.0)
+    monkeypatch.setattr(fm_api, "RATE_BURST", 10)
+    a, b = fm_api.get_client("a"), fm_api.get_client("b")
+    assert fm_api.get_client("a") is a
+    assert isinstance(a.rate_limiter, RateLimiter) and a.rate_limiter is not b.rate_limiter
+
+    fm_api.set_rate_limit(2.5, 4)
+    assert (a.rate_limiter.rate, a.rate_limiter.burst) == (2.5, 4.0)
+    assert (b.rate_limiter.rate, b.rate_limiter.burst) == (2.5, 4.0)
+    assert fm_api.get_client("c").rate_limiter.rate == 2.5
+
+
+def test_rate_limiter_waits_once_the_burst_is_spent(monkeypatch):
+    clock = [100.0]
+    slept: List[float] = []
+
+    def sleep(wait: float) -> None:
+        slept.append(wait)
+        clock[0] += wait
+
+    monkeypatch.setattr(fm_api.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(fm_api.time, "sleep", sleep)
+    limiter = RateLimiter(rate=2.0, burst=2)
+    for _ in range(4):
+        limiter.acquire()
+    assert slept == [pytest.approx(0.5), pytest.approx(0.5)]
@@ -0,0 +1,96 @@
+import math
+import random
+
+import numpy as np
+
+import geoutils
+from benchmarks.synthetic import make_geozones, zone_anchor
+from geoutils import SLAB_MIN_VERTICES, PolygonZone, Ring, _point_in_ring
+
+
+def large_rings():
+    """(Ring, coords) for every synthetic ring big enough for slabs."""
+    zones = make_geozones(300, polygon_share=1.0, vertices=(32, 64, 256), seed=5)
+    out = []
+    for g in zones:
+        for part in geoutils.polygon_parts(g["feature"]["geometry"]):
+            for coords in part:
+                if len(coords) >= SLAB_MIN_VERTICES:
+                    out.append((Ring(coords), coords))
+    return out
+
+
+def sample_points(coords, rnd, n=200):
+    """
+    Random points over the ring's bbox, plus points on vertex latitudes (slab boundaries).
+    Vertices themselves are left out: they lie on the boundary, where rounding decides.
+    """
+    xs = [p[0] for p in coords]
+    ys = [p[1] for p in coords]
+    pts = [(rnd.uniform(min(ys), max(ys)), rnd.uniform(min(xs), max(xs))) for _ in range(n)]
+    pts += [(y, rnd.uniform(min(xs), max(xs))) for y in rnd.sample(ys, 20)]
+    return pts
+
+
+def test_slabs_are_built_lazily():
+    ring, coords = large_rings()[0]
+    assert ring.slab_y is None
+    ring.contains(coords[0][1], coords[0][0])
+    assert ring.slabs_tried
+
+
+def test_slab_lookup_matches_point_in_ring():
+    rnd = random.Random(7)
+    rings = large_rings()
+    with_slabs = 0
+    for ring, coords in rings:
+        for lat, lon in sample_points(coords, rnd):
+            assert ring.contains(lat, lon) == _point_in_ring(lat, lon, coords), (lat, lon)
+        with_slabs += ring.slab_y is not None
+    assert with_slabs > len(rings) // 2
+
+
+def test_slab_batch_matches_point_in_ring():
+    rnd = random.Random(8)
+    for ring, coords in large_rings()[:50]:
+        pts = sample_points(coords, rnd)
+        ring.contains(pts[0][0], pts[0][1])
+        lats = np.array([p[0] for p in pts])
+        lons = np.array([p[1] for p in pts])
+        expected = [_point_in_ring(lat, lon, coords) for lat, lon in pts]
+        assert ring.contains_many(lats, lons).tolist() == expected
+
+
+def test_self_intersecting_ring_falls_back_to_scan():
+    # star polygon {n/3}: its edges cross each other
+    n = 41
+    coords = [[20 + math.cos(2 * math.pi * 3 * i / n), 47 + math.sin(2 * math.pi * 3 * i / n)] for i in range(n)]
+    coords.append(coords[0])
+    ring = Ring(coords)
+    rnd = random.Random(9)
+    for lat, lon in sample_points(coords, rnd):
+        assert ring.contains(lat, lon) == _point_in_ring(lat, lon, coords)
+    assert ring.slabs_tried and ring.slab_y is None
+
+
+def test_polygon_zone_with_hole():
+    outer = [[16 + math.cos(2 * math.pi * i / 64), 47 + math.sin(2 * math.pi * i / 64)] for i in range(64)]
+    hole = [[16 + 0.3 * math.cos(2 * math.pi * i / 40), 47 + 0.3 * math.sin(2 * math.pi * i / 40)] for i in range(40)]
+    zone = PolygonZone("z", [[outer + outer[:1], hole + hole[:1]]])
+    assert zone.contains(47.6, 16.0)
+    assert not zone.contains(47.1, 16.0)
+    assert not zone.contains(48.5, 16.0)
+
+
+def test_list_batch_lookup_is_exact_and_leaves_memo_alone():
+    zones = make_geozones(200, seed=3)
+    rnd = random.Random(4)
+    # around the zones' anchors, so plenty of points are inside one
+    sites = [zone_anchor(z) for z in zones]
+    pts = [(lat + rnd.gauss(0, 0.002), lon + rnd.gauss(0, 0.002)) for lat, lon in rnd.choices(sites, k=500)]
+    lats, lons = [p[0] for p in pts], [p[1] for p in pts]
+    geoutils.ZONE_MEMO.clear()
+    found = geoutils.geozones_for_points(lats, lons, zones)
+    assert geoutils.ZONE_MEMO.stats()["size"] == 0
+    assert any(found)
+    assert found == [geoutils.geozones_for_point(a, b, zones) for a, b in zip(lats, lons)]
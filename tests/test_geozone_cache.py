@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from geozone_cache import GeozoneCache
+
+ZONES = [{"id": 1, "name": "Depot", "type": "POINT", "circle": {"latitude": 47.0, "longitude": 19.0, "radius": 200}}]
+
+
+class StubClient:
+    """list_geozones()/iter_geozones() stand-in that can be switched to failing."""
+
+    def __init__(self):
+        self.fail = False
+        self.calls = 0
+
+    def _check(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("Geozones GET failed: 503")
+
+    def iter_geozones(self, *args, **kwargs):
+        self._check()
+        return iter([dict(z) for z in ZONES])
+
+    def list_geozones(self, *args, include_geometry=True, **kwargs):
+        self._check()
+        return [{k: v for k, v in z.items() if include_geometry or k != "circle"} for z in ZONES]
+
+
+def test_failed_revalidation_serves_cached_catalog():
+    client = StubClient()
+    cache = GeozoneCache(ttl=900, retry_after=60)
+    cat = cache.get("key", client)
+
+    client.fail = True
+    cat.validated_at -= 1000  # ttl expired
+    assert cache.get("key", client) is cat
+    assert client.calls == 2
+    # backed off: no new request until retry_after has passed
+    assert cache.get("key", client) is cat
+    assert client.calls == 2
+    assert time.monotonic() - cat.validated_at < 900
+
+    client.fail = False
+    cat.validated_at -= 1000
+    assert cache.get("key", client).index.lookup(47.0, 19.0) == ["Depot"]
+    assert client.calls == 3
+
+
+def test_failed_full_reload_serves_cached_catalog():
+    client = StubClient()
+    cache = GeozoneCache(max_age=3600, retry_after=60)
+    cat = cache.get("key", client)
+    client.fail = True
+    cat.loaded_at -= 7200
+    assert cache.get("key", client) is cat
+    assert cache.get("key", client) is cat
+    assert client.calls == 2
+
+
+def test_first_load_failure_raises():
+    client = StubClient()
+    client.fail = True
+    with pytest.raises(RuntimeError):
+        GeozoneCache().get("key", client)
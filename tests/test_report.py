@@ -0,0 +1,98 @@
+import datetime as dt
+from typing import Any, Dict, List, Optional
+
+from geoutils import GeozoneIndex
+from report import iter_report_records
+from transforms import TripTable
+
+
+def square(lon: float, lat: float, side: float) -> List[List[float]]:
+    return [[lon, lat], [lon + side, lat], [lon + side, lat + side], [lon, lat + side], [lon, lat]]
+
+
+GEOZONES = [
+    {"id": 1, "name": "Depot", "type": "POINT", "circle": {"latitude": 47.0, "longitude": 19.0, "radius": 200}},
+    # two parts, the second with a hole in the middle
+    {"id": 2, "name": "Yard", "type": "MULTIPOLYGON", "feature": {"geometry": {"type": "MultiPolygon", "coordinates": [
+        [square(19.10, 47.10, 0.01)],
+        [square(19.20, 47.20, 0.02), square(19.205, 47.205, 0.01)],
+    ]}}},
+    {"id": 3, "name": "Shop", "type": "POLYGON",
+     "feature": {"geometry": {"type": "Polygon", "coordinates": [square(19.30, 47.30, 0.01)]}}},
+]
+
+
+def ts(hhmm: str) -> int:
+    return int(dt.datetime.fromisoformat(f"2024-03-01T{hhmm}:00+00:00").timestamp())
+
+
+def point(hhmm: str, lat: Optional[float], lon: Optional[float], street: str = "") -> Dict[str, Any]:
+    p: Dict[str, Any] = {"datetime": f"2024-03-01T{hhmm}:00Z", "latitude": lat, "longitude": lon}
+    if street:
+        p["address"] = {"country": "HU", "street": street}
+    return p
+
+
+# Listed out of order; the report sorts by start time
+TRIPS = [
+    # part A of Yard -> endpoint without coordinates
+    {"trip_start": point("09:00", 47.105, 19.105, "Yard A"), "trip_end": point("09:10", None, None),
+     "mileage": 1500.0, "trip_duration": 600},
+    # Depot -> open road
+    {"trip_start": point("08:00", 47.0, 19.0, "Depot"), "trip_end": point("08:20", 47.5, 19.5, "Road"),
+     "mileage": 12345.6, "trip_duration": 1200},
+    # open road -> part B of Yard, outside its hole
+    {"trip_start": point("08:30", 47.5, 19.5, "Road"), "trip_end": point("08:50", 47.201, 19.201, "Yard B"),
+     "mileage": 8765.4, "trip_duration": 1200},
+    # inside the hole (no zone) -> Shop
+    {"trip_start": point("09:30", 47.21, 19.21, "Hole"), "trip_end": point("09:40", 47.305, 19.305, "Shop"),
+     "mileage": 2499.0, "trip_duration": 600},
+    # start without coordinates -> Depot
+    {"trip_start": {"datetime": "2024-03-01T10:00:00Z"}, "trip_end": point("10:15", 47.0005, 19.0, "Depot"),
+     "mileage": 700.25, "trip_duration": 900},
+    # Depot -> Shop
+    {"trip_start": point("11:00", 47.0, 19.0, "Depot"), "trip_end": point("11:30", 47.301, 19.301, "Shop"),
+     "mileage": 2499.6, "trip_duration": 1800},
+]
+
+ROWS = [
+    ("Depot", "HU, Depot", "08:00", "", "HU, Road", "08:20", 1200, 600),
+    ("", "HU, Road", "08:30", "Yard", "HU, Yard B", "08:50", 1200, 600),
+    ("Yard", "HU, Yard A", "09:00", "", "", "09:10", 600, 1200),
+    ("", "HU, Hole", "09:30", "Shop", "HU, Shop", "09:40", 600, 1200),
+    ("", "", "10:00", "Depot", "HU, Depot", "10:15", 900, 2700),
+    ("Depot", "HU, Depot", "11:00", "Shop", "HU, Shop", "11:30", 1800, None),
+]
+SEGMENTS = [
+    ("Depot", "HU, Depot", "08:00", "Yard", "HU, Yard B", "08:50", 2400, 600),
+    ("Yard", "HU, Yard A", "09:00", "Shop", "HU, Shop", "09:40", 1200, 1200),
+    ("Depot", "HU, Depot", "11:00", "Shop", "HU, Shop", "11:30", 1800, None),
+]
+
+
+def expected(fields: List[tuple], km: List[Any]) -> List[Dict[str, Any]]:
+    return [{"dep_zones": [dz] if dz else [], "dep_address": da, "dep_ts": ts(dt_),
+             "arr_zones": [az] if az else [], "arr_address": aa, "arr_ts": ts(at),
+             "km": k, "duration_s": dur, "stay_s": stay}
+            for (dz, da, dt_, az, aa, at, dur, stay), k in zip(fields, km)]
+
+
+def records(merge: bool, raw_mode: bool) -> List[Dict[str, Any]]:
+    return list(iter_report_records(TripTable.from_trips(TRIPS), GeozoneIndex(GEOZONES), merge, raw_mode))
+
+
+def test_trip_records_raw():
+    assert records(merge=False, raw_mode=True) == expected(ROWS, [12.346, 8.765, 1.5, 2.499, 0.7, 2.5])
+
+
+def test_trip_records_rounded():
+    assert records(merge=False, raw_mode=False) == expected(ROWS, [12, 9, 2, 2, 1, 2])
+
+
+def test_segment_records_raw():
+    assert records(merge=True, raw_mode=True) == expected(SEGMENTS, [21.111, 3.999, 2.5])
+
+
+def test_segment_records_rounded():
+    # segments are rounded to 3 decimals first: 2.4996 km -> 2.5 -> 3
+    assert records(merge=True, raw_mode=False) == expected(SEGMENTS, [21, 4, 3])
@@ -0,0 +1,89 @@
+import datetime as dt
+import random
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from benchmarks.synthetic import make_geozones, make_trips
+from transforms import TripTable, merge_short_trips
+
+
+def legacy_merge_short_trips(trips: List[Dict[str, Any]], min_minutes: int = 0,
+                             max_gap_minutes: int = 0) -> List[Dict[str, Any]]:
+    """The dict-based merge_short_trips() loop the columnar engine replaced, kept as the reference."""
+    if not trips:
+        return trips
+    thr_s = max(0, int(min_minutes)) * 60
+    gap_thr_s = max(0, int(max_gap_minutes)) * 60
+
+    def parse_iso(ts: Optional[str]) -> Optional[dt.datetime]:
+        if not ts:
+            return None
+        return dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+    def start_dt(t):
+        return parse_iso((t.get("trip_start") or {}).get("datetime"))
+
+    def end_dt(t):
+        return parse_iso((t.get("trip_end") or {}).get("datetime"))
+
+    def combine(group):
+        first, last = group[0], group[-1]
+        return {
+            "trip_start": first.get("trip_start") or {},
+            "trip_end": last.get("trip_end") or {},
+            "mileage": sum(float(x.get("mileage") or 0.0) for x in group),
+            "trip_duration": int(sum(int(x.get("trip_duration") or 0) for x in group)),
+            "trip_type": last.get("trip_type") or first.get("trip_type") or "merged",
+        }
+
+    result, group = [], []
+    for t in sorted(trips, key=lambda t: start_dt(t) or dt.datetime.min.replace(tzinfo=dt.timezone.utc)):
+        if not group:
+            group = [t]
+            continue
+        prev_end, curr_start = end_dt(group[-1]), start_dt(t)
+        gap_s = int((curr_start - prev_end).total_seconds()) if prev_end and curr_start else None
+        if int(t.get("trip_duration") or 0) < thr_s or (gap_s is not None and gap_s <= gap_thr_s):
+            group.append(t)
+        else:
+            result.append(combine(group))
+            group = [t]
+    if group:
+        result.append(combine(group))
+    return result
+
+
+def messy_trips(n: int = 3000, seed: int = 11) -> List[Dict[str, Any]]:
+    """Synthetic trips, shuffled, with odd mileages and some missing times and coordinates."""
+    rnd = random.Random(seed)
+    trips = make_trips(n, make_geozones(100), seed=seed)
+    for t in trips:
+        t["mileage"] = rnd.choice((0.1, 0.7, 1 / 3, rnd.uniform(0, 1e5), None))
+        r = rnd.random()
+        if r < 0.03:
+            t["trip_start"].pop("datetime")
+        elif r < 0.06:
+            t["trip_end"] = {}
+        elif r < 0.09:
+            t["trip_start"].pop("latitude")
+            t["trip_end"]["longitude"] = None
+    rnd.shuffle(trips)
+    return trips
+
+
+@pytest.mark.parametrize("min_minutes,max_gap_minutes", [(0, 0), (5, 0), (0, 10), (15, 30), (0, 100000)])
+def test_merge_short_matches_legacy_loop(min_minutes, max_gap_minutes):
+    trips = messy_trips()
+    expected = legacy_merge_short_trips(trips, min_minutes, max_gap_minutes)
+    table = TripTable.from_trips(trips).merge_short(min_minutes, max_gap_minutes)
+    # exact equality, mileage floats included
+    assert table.to_trips() == expected
+    assert merge_short_trips(trips, min_minutes, max_gap_minutes) == expected
+
+
+def test_re_merging_a_table_matches_legacy_loop():
+    trips = messy_trips(seed=12)
+    table = TripTable.from_trips(trips).sorted_by_start()
+    for thresholds in [(0, 10), (30, 0), (0, 10)]:
+        assert table.merge_short(*thresholds).to_trips() == legacy_merge_short_trips(trips, *thresholds)
@@ -0,0 +1,58 @@
+import datetime as dt
+
+from benchmarks.fake_api import FakeFmApi
+from trip_cache import TripCache
+
+UTC = dt.timezone.utc
+
+
+def trip(start: str, end: str):
+    return {"trip_start": {"datetime": f"2024-03-01T{start}:00Z"}, "trip_end": {"datetime": f"2024-03-01T{end}:00Z"}}
+
+
+def at(hhmm: str) -> dt.datetime:
+    return dt.datetime.fromisoformat(f"2024-03-01T{hhmm}:00+00:00")
+
+
+def make_fetch(api: FakeFmApi):
+    # start-in-range semantics, as the real API and the benchmark stand-in apply them
+    def fetch(from_dt: dt.datetime, to_dt: dt.datetime):
+        q = {"from_datetime": from_dt.strftime("%Y-%m-%dT%H:%M:%SZ"), "to_datetime": to_dt.strftime("%Y-%m-%dT%H:%M:%SZ")}
+        return api.handle("/objects/1/trips", q)[1]["trips"]
+    return fetch
+
+
+def test_cached_and_uncached_reads_match(tmp_path):
+    trips = [trip("08:00", "08:30"), trip("11:50", "12:10"), trip("15:00", "15:20")]
+    api = FakeFmApi([], [], {"1": trips})
+    fetch = make_fetch(api)
+
+    fresh = TripCache(str(tmp_path / "fresh.sqlite"))
+    expected = fresh.get_trips("1", at("12:00"), at("23:59"), fetch)
+
+    warm = TripCache(str(tmp_path / "warm.sqlite"))
+    warm.get_trips("1", at("00:00"), at("12:00"), fetch)
+    assert warm.get_trips("1", at("12:00"), at("23:59"), fetch) == expected == fetch(at("12:00"), at("23:59"))
+    assert [t["trip_start"]["datetime"] for t in expected] == ["2024-03-01T15:00:00Z"]
+
+
+def test_trip_in_progress_is_fetched_again(tmp_path):
+    now = dt.datetime.now(UTC).replace(microsecond=0)
+    iso = lambda d: d.strftime("%Y-%m-%dT%H:%M:%SZ")
+    # a long-haul trip that started 3 h ago and was still running at the first fetch
+    long_haul = {"trip_start": {"datetime": iso(now - dt.timedelta(hours=3))},
+                 "trip_end": {"datetime": iso(now - dt.timedelta(minutes=10))}}
+    earlier = {"trip_start": {"datetime": iso(now - dt.timedelta(hours=5))},
+               "trip_end": {"datetime": iso(now - dt.timedelta(hours=4))}}
+    api = FakeFmApi([], [], {"1": [earlier, long_haul]})
+    fetch = make_fetch(api)
+    cache = TripCache(str(tmp_path / "trips.sqlite"))
+    from_dt, to_dt = now - dt.timedelta(hours=6), now - dt.timedelta(hours=2)
+
+    assert len(cache.get_trips("1", from_dt, to_dt, fetch)) == 2
+    # the earlier, finished part of the range stays covered
+    assert cache.covered("1") == [(int(from_dt.timestamp()), int((now - dt.timedelta(hours=3)).timestamp()))]
+
+    long_haul["trip_end"]["datetime"] = iso(now)
+    trips = cache.get_trips("1", from_dt, to_dt, fetch)
+    assert [t["trip_end"]["datetime"] for t in trips] == [earlier["trip_end"]["datetime"], iso(now)]
@@ -1,7 +1,12 @@
-from geoutils import geozones_for_point
+from geoutils import GeozoneIndex, geozones_for_points
 from datetime import timezone
 import datetime as dt
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import numpy as np
+
+from metrics import incr, timed
 
 
 def parse_iso(ts: Optional[str]) -> Optional[dt.datetime]:
@@ -20,21 +25,50 @@ def parse_iso(ts: Optional[str]) -> Optional[dt.datetime]:
         dt_obj = dt.datetime.strptime(ts[:19], "%Y-%m-%dT%H:%M:%S")
         return dt_obj.replace(tzinfo=timezone.utc)
 
-def _combine_trips(group: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Concatenate multiple consecutive trips into a single trip."""
-    first, last = group[0], group[-1]
-    return {
-        # copy start/end blocks from the first/last trip
-        "trip_start": first.get("trip_start") or {},
-        "trip_end": last.get("trip_end") or {},
-        # sum up numeric fields
-        "mileage": sum(float(t.get("mileage") or 0.0) for t in group),
-        "trip_duration": int(sum(int(t.get("trip_duration") or 0) for t in group)),
-        # type take from last (or "merged")
-        "trip_type": last.get("trip_type") or first.get("trip_type") or "merged",
-        # any other fields that may be needed can be added here later
-    }
+_UNIX_EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+# Sort key for trips without a start time (same position as datetime.min)
+MIN_EPOCH = int(dt.datetime.min.replace(tzinfo=timezone.utc).timestamp())
 
+@lru_cache(maxsize=65536)
+def parse_epoch(ts: Optional[str]) -> Optional[int]:
+    """
+    Timestamp string -> epoch seconds (UTC), memoized.
+    'YYYY-MM-DDTHH:MM:SS' with 'Z', '±HH:MM' or no suffix takes a fixed-offset fast path;
+    anything else goes through parse_iso(). Fractions of a second are dropped.
+    """
+    if not ts:
+        return None
+    try:
+        if len(ts) >= 19 and ts[4] == "-" and ts[7] == "-" and ts[13] == ":" and ts[16] == ":":
+            tail = ts[19:]
+            if tail in ("", "Z"):
+                offset = 0
+            elif len(tail) == 6 and tail[0] in "+-" and tail[3] == ":":
+                offset = (int(tail[1:3]) * 3600 + int(tail[4:6]) * 60) * (1 if tail[0] == "+" else -1)
+            else:
+                offset = None
+            if offset is not None:
+                days = dt.date(int(ts[0:4]), int(ts[5:7]), int(ts[8:10])).toordinal() - _UNIX_EPOCH_ORDINAL
+                return days * 86400 + int(ts[11:13]) * 3600 + int(ts[14:16]) * 60 + int(ts[17:19]) - offset
+    except ValueError:
+        pass
+    return int(parse_iso(ts).timestamp())
+
+def trip_start_ts(t: Dict[str, Any]) -> Optional[int]:
+    return parse_epoch((t.get("trip_start") or {}).get("datetime"))
+
+def trip_end_ts(t: Dict[str, Any]) -> Optional[int]:
+    return parse_epoch((t.get("trip_end") or {}).get("datetime"))
+
+def epoch_to_dt(ts: Optional[int]) -> Optional[dt.datetime]:
+    return dt.datetime.fromtimestamp(ts, timezone.utc) if ts is not None else None
+
+def fmt_hms(total_seconds: int | float | None) -> str:
+    s = int(total_seconds or 0)
+    h = s // 3600
+    m = (s % 3600) // 60
+    sec = s % 60
+    return f"{h:02d}:{m:02d}:{sec:02d}"
 
 def merge_short_trips(
     trips: List[Dict[str, Any]],
@@ -50,119 +84,11 @@ def merge_short_trips(
     Notes:
     - Operates in chronological order.
     - Back-to-back trips (0 sec gap) are automatically merged if max_gap_minutes >= 0.
+    - Runs on TripTable.merge_short(); use that directly to stay columnar.
     """
     if not trips:
         return trips
-
-    thr_s = max(0, int(min_minutes)) * 60
-    gap_thr_s = max(0, int(max_gap_minutes)) * 60
-
-    def parse_iso(ts: Optional[str]) -> Optional[dt.datetime]:
-        if not ts:
-            return None
-        try:
-            if ts.endswith("Z"):
-                return dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            obj = dt.datetime.fromisoformat(ts)
-            return obj if obj.tzinfo else obj.replace(tzinfo=dt.timezone.utc)
-        except Exception:
-            obj = dt.datetime.strptime(ts[:19], "%Y-%m-%dT%H:%M:%S")
-            return obj.replace(tzinfo=dt.timezone.utc)
-
-    def start_dt(t: Dict[str, Any]) -> Optional[dt.datetime]:
-        return parse_iso((t.get("trip_start") or {}).get("datetime"))
-
-    def end_dt(t: Dict[str, Any]) -> Optional[dt.datetime]:
-        return parse_iso((t.get("trip_end") or {}).get("datetime"))
-
-    def _combine(group: List[Dict[str, Any]]) -> Dict[str, Any]:
-        first, last = group[0], group[-1]
-        return {
-            "trip_start": first.get("trip_start") or {},
-            "trip_end":   last.get("trip_end") or {},
-            "mileage":    sum(float(x.get("mileage") or 0.0) for x in group),
-            "trip_duration": int(sum(int(x.get("trip_duration") or 0) for x in group)),
-            "trip_type":  last.get("trip_type") or first.get("trip_type") or "merged",
-        }
-
-    trips_sorted = sorted(trips, key=lambda t: start_dt(t) or dt.datetime.min.replace(tzinfo=dt.timezone.utc))
-    result: List[Dict[str, Any]] = []
-    group: List[Dict[str, Any]] = []
-
-    for t in trips_sorted:
-        dur = int(t.get("trip_duration") or 0)
-
-        if not group:
-            group = [t]
-            continue
-
-        prev = group[-1]
-        prev_end = end_dt(prev)
-        curr_start = start_dt(t)
-        gap_s = None
-        if prev_end and curr_start:
-            gap_s = int((curr_start - prev_end).total_seconds())
-
-        # if the trip is short OR the gap <= threshold → keep in the current group
-        if dur < thr_s or (gap_s is not None and gap_s <= gap_thr_s):
-            group.append(t)
-        else:
-            # close the previous group and start a new one
-            result.append(_combine(group))
-            group = [t]
-
-    if group:
-        result.append(_combine(group))
-
-    return result
-
-    if not trips or min_minutes is None or min_minutes < 0:
-        return trips
-
-    thr_s = int(min_minutes) * 60
-
-    def start_dt(t: Dict[str, Any]) -> Optional[dt.datetime]:
-        return parse_iso((t.get("trip_start") or {}).get("datetime"))
-
-    def end_dt(t: Dict[str, Any]) -> Optional[dt.datetime]:
-        return parse_iso((t.get("trip_end") or {}).get("datetime"))
-
-    trips_sorted = sorted(trips, key=lambda t: start_dt(t) or dt.datetime.min)
-    result: List[Dict[str, Any]] = []
-    pending_group: List[Dict[str, Any]] = []
-
-    for i, t in enumerate(trips_sorted):
-        dur = int(t.get("trip_duration") or 0)
-
-        # if this is the first trip, always start with it
-        if not pending_group:
-            pending_group = [t]
-            continue
-
-        prev = pending_group[-1]
-        prev_end = end_dt(prev)
-        curr_start = start_dt(t)
-        gap_s = None
-        if prev_end and curr_start:
-            gap_s = (curr_start - prev_end).total_seconds()
-
-        # if there is a short or zero pause compared to the previous, or the trip is short, then merge
-        if (gap_s is not None and gap_s <= 0) or dur < thr_s:
-            pending_group.append(t)
-            continue
-
-        # otherwise close the current group and start a new one
-        if pending_group:
-            merged = _combine_trips(pending_group)
-            result.append(merged)
-        pending_group = [t]
-
-    # close remaining items
-    if pending_group:
-        merged = _combine_trips(pending_group)
-        result.append(merged)
-
-    return result
+    return TripTable.from_trips(trips).merge_short(min_minutes, max_gap_minutes).to_trips()
 
 
 def pair_out_in(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -205,123 +131,284 @@ def format_address(addr: Optional[Dict[str, Any]]) -> str:
     ]
     return ", ".join([p for p in parts if p])
 
-def trips_to_zone_pairs(trips: List[Dict[str, Any]], geozones: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _segment_sums(values: np.ndarray, heads: np.ndarray, tails: np.ndarray) -> np.ndarray:
     """
-    Creates zone-to-zone transition rows:
-    - Aggregates total distance and duration (from multiple trips)
-    - Adds "Stay (hh:mm:ss)" column showing how long the vehicle stayed
-      in the arrival zone before the next trip started (based on Trips API only)
+    Sum values[heads[g]:tails[g] + 1] per segment with sum(), like the dict-based merge did.
+
+    np.add.reduceat sums floats pairwise, which can differ from sum() in the last bit.
+    Single-row segments (most of them) are copied as they are; only the rest go through sum().
+    """
+    out = values[heads].copy()
+    multi = np.flatnonzero(tails > heads)
+    if len(multi):
+        vals = values.tolist()
+        out[multi] = [sum(vals[h:t + 1]) for h, t in zip(heads[multi].tolist(), tails[multi].tolist())]
+    return out
+
+class TripTable:
     """
+    Columnar form of find_trips() output, built once and shared by the transforms.
 
-    def fmt_hms(total_seconds: float | int | None) -> str:
-        s = int(total_seconds or 0)
-        h = s // 3600
-        m = (s % 3600) // 60
-        sec = s % 60
-        return f"{h:02d}:{m:02d}:{sec:02d}"
-
-    def parse_hms(hms: str | None) -> int:
-        """'HH:MM:SS' -> total seconds. Empty/None -> 0."""
-        if not hms or not isinstance(hms, str):
-            return 0
-        try:
-            h, m, s = hms.split(":")
-            return int(h) * 3600 + int(m) * 60 + int(s)
-        except Exception:
-            return 0
-
-    # Preparation: trip -> zones, times, addresses
-    prepared: List[Dict[str, Any]] = []
-    for t in trips:
-        start = t.get("trip_start", {}) or {}
-        end = t.get("trip_end", {}) or {}
-        s_lat, s_lon = start.get("latitude"), start.get("longitude")
-        e_lat, e_lon = end.get("latitude"), end.get("longitude")
-        prepared.append({
-            "trip": t,
-            "start_dt": parse_iso(start.get("datetime")),
-            "end_dt": parse_iso(end.get("datetime")),
-            "start_zones": geozones_for_point(s_lat, s_lon, geozones),
-            "end_zones": geozones_for_point(e_lat, e_lon, geozones),
-            "start_address": format_address(start.get("address")),
-            "end_address": format_address(end.get("address")),
-        })
-
-    # Chronological order
-    prepared.sort(key=lambda x: (x["start_dt"] or dt.datetime.min.replace(tzinfo=timezone.utc)))
+    Per-record columns (epochs; coordinates and interned address ids on first use) are
+    computed once from the source trips. A table row points at the record supplying its start side (`first`)
+    and its end side (`last`), so a merged table shares those columns with its source and
+    only owns the per-row mileage, duration and trip type.
 
-    rows: List[Dict[str, Any]] = []
+    Sort order, gaps and endpoint zones are memoized, so re-merging a cached table with
+    new thresholds only redoes the grouping.
+    """
 
-    # Active segment state
-    active_dep_name: Optional[str] = None
-    active_dep_addr: Optional[str] = None
-    active_dep_dt: Optional[dt.datetime] = None
-    active_total_meters: float = 0.0
-    active_total_duration_s: int = 0
-
-    def close_segment(arr_names: List[str], arr_addr: str, arr_dt: Optional[dt.datetime],
-                      stay_seconds: Optional[int] = None) -> None:
-        """Close a segment and append it to the table."""
-        nonlocal active_dep_name, active_dep_addr, active_dep_dt, active_total_meters, active_total_duration_s
-        if not active_dep_name:
-            return
-        rows.append({
-            "Departure": f"<b style='color:red'>{active_dep_name}</b> : {active_dep_addr or ''}",
-            "Departure at": active_dep_dt,
-            "Arrival": f"<b style='color:red'>{', '.join(arr_names)}</b> : {arr_addr or ''}",
-            "Arrival at": arr_dt,
-            "Distance (km)": round((active_total_meters or 0.0) / 1000.0, 3),
-            "Duration": fmt_hms(active_total_duration_s),
-            "Stay (hh:mm:ss)": fmt_hms(stay_seconds) if stay_seconds is not None else "",
-        })
-        # reset
-        active_dep_name = None
-        active_dep_addr = None
-        active_dep_dt = None
-        active_total_meters = 0.0
-        active_total_duration_s = 0
-
-    for idx, item in enumerate(prepared):
-        trip = item["trip"]
-        trip_meters = float(trip.get("mileage") or 0.0)
-        trip_dur_s = int(trip.get("trip_duration") or 0)
-        start_has_zone = bool(item["start_zones"])
-        end_has_zone = bool(item["end_zones"])
+    def __init__(self, records: List[Dict[str, Any]], cols: Dict[str, Any],
+                 first: np.ndarray, last: np.ndarray,
+                 mileage: np.ndarray, duration: np.ndarray, trip_type: List[Optional[str]]):
+        self.records = records
+        self.cols = cols
+        self.first = first
+        self.last = last
+        self.mileage = mileage
+        self.duration = duration
+        self.trip_type = trip_type
+        self.is_sorted = False
+        self._gaps: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    @timed("transforms.from_trips")
+    def from_trips(cls, trips: List[Dict[str, Any]]) -> "TripTable":
+        n = len(trips)
+        s_ts = [trip_start_ts(t) for t in trips]
+        e_ts = [trip_end_ts(t) for t in trips]
+        cols = {
+            "start_ts": np.array([MIN_EPOCH if v is None else v for v in s_ts], dtype=np.int64),
+            "has_start": np.array([v is not None for v in s_ts], dtype=bool),
+            "end_ts": np.array([MIN_EPOCH if v is None else v for v in e_ts], dtype=np.int64),
+            "has_end": np.array([v is not None for v in e_ts], dtype=bool),
+        }
+        rows = np.arange(n, dtype=np.int64)
+        return cls(
+            trips, cols, rows, rows.copy(),
+            np.array([float(t.get("mileage") or 0.0) for t in trips], dtype=float),
+            np.array([int(t.get("trip_duration") or 0) for t in trips], dtype=np.int64),
+            [t.get("trip_type") for t in trips],
+        )
+
+    def places(self) -> Dict[str, Any]:
+        """
+        Per-record coordinates and interned addresses, built on first use and shared with every
+        table over the same records. Merging never needs them, so merge_short_trips() skips them.
+        """
+        c = self.cols
+        if "addresses" in c:
+            return c
+        with timed("transforms.places"):
+            starts = [t.get("trip_start", {}) or {} for t in self.records]
+            ends = [t.get("trip_end", {}) or {} for t in self.records]
+            addresses: List[str] = []
+            interned: Dict[str, int] = {}
+
+            def addr_id(point: Dict[str, Any]) -> int:
+                text = format_address(point.get("address"))
+                if text not in interned:
+                    interned[text] = len(addresses)
+                    addresses.append(text)
+                return interned[text]
+
+            def coord(points: List[Dict[str, Any]], key: str) -> np.ndarray:
+                return np.array([np.nan if p.get(key) is None else p.get(key) for p in points], dtype=float)
+
+            c.update({
+                "start_lat": coord(starts, "latitude"), "start_lon": coord(starts, "longitude"),
+                "end_lat": coord(ends, "latitude"), "end_lon": coord(ends, "longitude"),
+                "start_addr": np.array([addr_id(p) for p in starts], dtype=np.int32),
+                "end_addr": np.array([addr_id(p) for p in ends], dtype=np.int32),
+                # last, so other threads only see the columns once all of them are in
+                "addresses": addresses,
+            })
+        return c
+
+    def __len__(self) -> int:
+        return len(self.first)
+
+    # --- row views over the per-record columns ---
+    @property
+    def start_ts(self) -> np.ndarray:
+        return self.cols["start_ts"][self.first]
+
+    @property
+    def has_start(self) -> np.ndarray:
+        return self.cols["has_start"][self.first]
+
+    @property
+    def end_ts(self) -> np.ndarray:
+        return self.cols["end_ts"][self.last]
+
+    @property
+    def has_end(self) -> np.ndarray:
+        return self.cols["has_end"][self.last]
+
+    def start_address(self, i: int) -> str:
+        c = self.places()
+        return c["addresses"][c["start_addr"][self.first[i]]]
+
+    def end_address(self, i: int) -> str:
+        c = self.places()
+        return c["addresses"][c["end_addr"][self.last[i]]]
+
+    def take(self, idx: np.ndarray) -> "TripTable":
+        return TripTable(self.records, self.cols, self.first[idx], self.last[idx],
+                         self.mileage[idx], self.duration[idx], [self.trip_type[i] for i in idx.tolist()])
+
+    def sorted_by_start(self) -> "TripTable":
+        """Rows in chronological order (stable; rows without a start time sort first)."""
+        if self.is_sorted:
+            return self
+        t = self.take(np.argsort(self.start_ts, kind="stable"))
+        t.is_sorted = True
+        return t
+
+    def gaps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(seconds from the previous row's end to this row's start, known mask); row 0 has no gap."""
+        if self._gaps is None:
+            gap = np.zeros(len(self), dtype=np.int64)
+            known = np.zeros(len(self), dtype=bool)
+            if len(self) > 1:
+                gap[1:] = self.start_ts[1:] - self.end_ts[:-1]
+                known[1:] = self.has_start[1:] & self.has_end[:-1]
+            self._gaps = (gap, known)
+        return self._gaps
+
+    @timed("transforms.merge_short")
+    def merge_short(self, min_minutes: int = 0, max_gap_minutes: int = 0) -> "TripTable":
+        """Vectorized merge_short_trips(): sorted rows grouped by the short-trip and gap masks."""
+        if not len(self):
+            return self
+        t = self.sorted_by_start()
+        thr_s = max(0, int(min_minutes)) * 60
+        gap_thr_s = max(0, int(max_gap_minutes)) * 60
+        gap, known = t.gaps()
+        # a row joins the previous row's group if it is short or follows a short enough stop
+        joins = (t.duration < thr_s) | (known & (gap <= gap_thr_s))
+        joins[0] = False
+        heads = np.flatnonzero(~joins)
+        tails = np.append(heads[1:] - 1, len(t) - 1)
+        types = [t.trip_type[b] or t.trip_type[a] or "merged" for a, b in zip(heads.tolist(), tails.tolist())]
+        merged = TripTable(
+            self.records, self.cols, t.first[heads], t.last[tails],
+            _segment_sums(t.mileage, heads, tails), np.add.reduceat(t.duration, heads), types,
+        )
+        merged.is_sorted = True  # groups keep the chronological order of their heads
+        return merged
+
+    def endpoint_zones(self, geozones: List[Dict[str, Any]] | GeozoneIndex) -> Tuple[List[List[str]], List[List[str]]]:
+        """(start zone names, end zone names) per row, classifying every record endpoint in one batch."""
+        c = self.cols
+        # per-record result shared by every table over these records; redone only for other geozones
+        memo = c.get("zones")
+        if memo is not None and memo[0] is geozones:
+            zones = memo[1]
+            incr("transforms.endpoint_zones_reused")
+        else:
+            self.places()
+            with timed("transforms.endpoint_zones"):
+                lats = np.concatenate([c["start_lat"], c["end_lat"]])
+                lons = np.concatenate([c["start_lon"], c["end_lon"]])
+                zones = geozones_for_points(lats.tolist(), lons.tolist(), geozones)
+            c["zones"] = (geozones, zones)
+        n = len(self.records)
+        return [zones[i] for i in self.first.tolist()], [zones[n + i] for i in self.last.tolist()]
+
+    def to_trips(self) -> List[Dict[str, Any]]:
+        """Rows as trip dicts (the shape merge_short_trips() returns)."""
+        out: List[Dict[str, Any]] = []
+        for i, (a, b) in enumerate(zip(self.first.tolist(), self.last.tolist())):
+            first, last = self.records[a], self.records[b]
+            out.append({
+                "trip_start": first.get("trip_start") or {},
+                "trip_end": last.get("trip_end") or {},
+                "mileage": float(self.mileage[i]),
+                "trip_duration": int(self.duration[i]),
+                "trip_type": self.trip_type[i],
+            })
+        return out
+
+def iter_trip_rows(trips: List[Dict[str, Any]] | TripTable,
+                   geozones: List[Dict[str, Any]] | GeozoneIndex,
+                   ) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """
+    The single pass behind both report modes: for every trip, in chronological order,
+    (trip row, zone-to-zone segment closed by this trip or None).
+
+    Rows and segments share one numeric shape: dep_zones / arr_zones (names), dep_address /
+    arr_address, dep_ts / arr_ts (epoch seconds or None), meters, duration_s and stay_s
+    (seconds until the next trip starts; None when unknown or not positive).
+    A segment opens at a trip leaving a zone and adds up every trip until one ends in a zone;
+    leaving another zone on the way restarts it. A segment that never arrives is dropped.
+    """
+    # Columnar trips in chronological order; every endpoint is classified in one batched pass
+    table = trips if isinstance(trips, TripTable) else TripTable.from_trips(trips)
+    table = table.sorted_by_start()
+    start_zones, end_zones = table.endpoint_zones(geozones)
+    gap_s, gap_known = (a.tolist() for a in table.gaps())
+    start_ts, has_start = table.start_ts.tolist(), table.has_start.tolist()
+    end_ts, has_end = table.end_ts.tolist(), table.has_end.tolist()
+    mileage, duration = table.mileage.tolist(), table.duration.tolist()
+    n = len(table)
+
+    # Active segment: departure fields plus running totals
+    segment: Optional[Dict[str, Any]] = None
+
+    for i in range(n):
+        row = {
+            "dep_zones": start_zones[i],
+            "dep_address": table.start_address(i),
+            "dep_ts": start_ts[i] if has_start[i] else None,
+            "arr_zones": end_zones[i],
+            "arr_address": table.end_address(i),
+            "arr_ts": end_ts[i] if has_end[i] else None,
+            "meters": mileage[i],
+            "duration_s": duration[i],
+            "stay_s": gap_s[i + 1] if i + 1 < n and gap_known[i + 1] and gap_s[i + 1] > 0 else None,
+        }
+        closed = None
 
         # Open a segment if departing from a zone
-        if active_dep_name is None and start_has_zone:
-            active_dep_name = ", ".join(item["start_zones"])
-            active_dep_addr = item["start_address"]
-            active_dep_dt = item["start_dt"]
-            active_total_meters = 0.0
-            active_total_duration_s = 0
+        if segment is None and row["dep_zones"]:
+            segment = {"dep_zones": row["dep_zones"], "dep_address": row["dep_address"], "dep_ts": row["dep_ts"],
+                       "meters": 0.0, "duration_s": 0}
 
         # If there is an active segment, add EVERY trip's distance and time
-        if active_dep_name is not None:
-            active_total_meters += trip_meters
-            active_total_duration_s += trip_dur_s
-
-            # If it ends in a zone, close the segment
-            if end_has_zone:
-                # Next trip start (to compute stay)
-                stay_seconds = None
-                if idx + 1 < len(prepared):
-                    next_trip = prepared[idx + 1]
-                    if next_trip.get("start_dt") and item.get("end_dt"):
-                        delta = (next_trip["start_dt"] - item["end_dt"]).total_seconds()
-                        if delta > 0:
-                            stay_seconds = int(delta)
-
-                close_segment(item["end_zones"], item["end_address"], item["end_dt"], stay_seconds)
-                continue
-
-            # If along the way it starts again from a zone (e.g., another zone)
-            if start_has_zone:
-                active_dep_name = ", ".join(item["start_zones"])
-                active_dep_addr = item["start_address"]
-                active_dep_dt = item["start_dt"]
-                active_total_meters = trip_meters
-                active_total_duration_s = trip_dur_s
-
-    # Open segment (no closing zone) is not included
-    return rows
+        if segment is not None:
+            segment["meters"] += row["meters"]
+            segment["duration_s"] += row["duration_s"]
+            if row["arr_zones"]:
+                # Ends in a zone: close the segment
+                closed = {**segment, "arr_zones": row["arr_zones"], "arr_address": row["arr_address"],
+                          "arr_ts": row["arr_ts"], "stay_s": row["stay_s"]}
+                segment = None
+            elif row["dep_zones"]:
+                # Along the way it starts again from another zone
+                segment = {"dep_zones": row["dep_zones"], "dep_address": row["dep_address"], "dep_ts": row["dep_ts"],
+                           "meters": row["meters"], "duration_s": row["duration_s"]}
+
+        yield row, closed
+
+
+@timed("transforms.zone_pairs")
+def trips_to_zone_pairs(trips: List[Dict[str, Any]] | TripTable,
+                        geozones: List[Dict[str, Any]] | GeozoneIndex) -> List[Dict[str, Any]]:
+    """
+    Creates zone-to-zone transition rows:
+    - Aggregates total distance and duration (from multiple trips)
+    - Adds "Stay (hh:mm:ss)" column showing how long the vehicle stayed
+      in the arrival zone before the next trip started (based on Trips API only)
+
+    The segments of iter_trip_rows(), formatted; report.py formats them at render time instead.
+    """
+    return [{
+        "Departure": f"<b style='color:red'>{', '.join(seg['dep_zones'])}</b> : {seg['dep_address'] or ''}",
+        "Departure at": epoch_to_dt(seg["dep_ts"]),
+        "Arrival": f"<b style='color:red'>{', '.join(seg['arr_zones'])}</b> : {seg['arr_address'] or ''}",
+        "Arrival at": epoch_to_dt(seg["arr_ts"]),
+        "Distance (km)": round((seg["meters"] or 0.0) / 1000.0, 3),
+        "Duration": fmt_hms(seg["duration_s"]),
+        "Stay (hh:mm:ss)": fmt_hms(seg["stay_s"]) if seg["stay_s"] is not None else "",
+    } for _, seg in iter_trip_rows(trips, geozones) if seg is not None]
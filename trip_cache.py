@@ -0,0 +1,184 @@
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import incr, timed
+from transforms import parse_epoch
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "LOGBOOK_TRIP_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "logbook", "trips.sqlite"),
+)
+
+Fetcher = Callable[[dt.datetime, dt.datetime], List[Dict[str, Any]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trips (
+    object_id TEXT NOT NULL,
+    trip_key  TEXT NOT NULL,
+    start_ts  INTEGER NOT NULL,
+    end_ts    INTEGER NOT NULL,
+    data      TEXT NOT NULL,
+    PRIMARY KEY (object_id, trip_key)
+);
+CREATE INDEX IF NOT EXISTS trips_by_start ON trips (object_id, start_ts);
+CREATE TABLE IF NOT EXISTS coverage (
+    object_id TEXT NOT NULL,
+    from_ts   INTEGER NOT NULL,
+    to_ts     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_by_object ON coverage (object_id, from_ts);
+"""
+
+
+def _epoch(value: Optional[dt.datetime]) -> Optional[int]:
+    return int(value.timestamp()) if value else None
+
+
+def _merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for a, b in sorted(intervals):
+        # touching intervals (1 s apart) are merged as well
+        if merged and a <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+        else:
+            merged.append((a, b))
+    return merged
+
+
+def _gaps(from_ts: int, to_ts: int, covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    gaps: List[Tuple[int, int]] = []
+    cursor = from_ts
+    for a, b in covered:
+        if b < cursor:
+            continue
+        if a > to_ts:
+            break
+        if a > cursor:
+            gaps.append((cursor, a))
+        cursor = max(cursor, b)
+    if cursor < to_ts:
+        gaps.append((cursor, to_ts))
+    return gaps
+
+
+class TripCache:
+    """
+    On-disk SQLite cache of trips per object, indexed by trip start time.
+
+    It records which time intervals have already been fetched, so get_trips() only asks the
+    API for the uncovered gaps. Intervals newer than `settle`, and anything from the start of a
+    trip that had not ended `settle` ago, are fetched but not marked covered, because trips
+    still in progress may change.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, settle: dt.timedelta = dt.timedelta(hours=1)):
+        self.path = path
+        self.settle = settle
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call, so the cache can be shared across threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def covered(self, object_id: str) -> List[Tuple[int, int]]:
+        """Merged [from_ts, to_ts] epoch intervals already stored for the object."""
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT from_ts, to_ts FROM coverage WHERE object_id = ? ORDER BY from_ts", (object_id,)
+            ).fetchall()
+        return _merge_intervals([(a, b) for a, b in rows])
+
+    def store(self, object_id: str, trips: List[Dict[str, Any]],
+              from_dt: Optional[dt.datetime] = None, to_dt: Optional[dt.datetime] = None) -> None:
+        """
+        Upsert trips and, if a range is given, mark its settled part as covered. Coverage stops at
+        the start of any trip still open at the settle horizon (no end yet, or ending after it), so
+        that trip is fetched again until its end has settled.
+        """
+        horizon = _epoch(dt.datetime.now(dt.timezone.utc) - self.settle)
+        open_from: Optional[int] = None
+        rows = []
+        for t in trips:
+            start = (t.get("trip_start") or {}).get("datetime")
+            start_ts = parse_epoch(start)
+            end_ts = parse_epoch((t.get("trip_end") or {}).get("datetime"))
+            data = json.dumps(t, separators=(",", ":"))
+            if start_ts is None:
+                continue
+            if end_ts is None or end_ts > horizon:
+                open_from = start_ts if open_from is None else min(open_from, start_ts)
+            rows.append((object_id, start or data, start_ts, end_ts if end_ts is not None else start_ts, data))
+
+        new_cover: List[Tuple[int, int]] = []
+        if from_dt is not None and to_dt is not None:
+            a, b = _epoch(from_dt), min(_epoch(to_dt), horizon)
+            if open_from is not None:
+                b = min(b, open_from)
+            if a < b:
+                new_cover.append((a, b))
+
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO trips VALUES (?, ?, ?, ?, ?)", rows)
+            if new_cover:
+                old = conn.execute("SELECT from_ts, to_ts FROM coverage WHERE object_id = ?", (object_id,)).fetchall()
+                conn.execute("DELETE FROM coverage WHERE object_id = ?", (object_id,))
+                conn.executemany(
+                    "INSERT INTO coverage VALUES (?, ?, ?)",
+                    [(object_id, a, b) for a, b in _merge_intervals([tuple(r) for r in old] + new_cover)],
+                )
+
+    def read(self, object_id: str, from_dt: dt.datetime, to_dt: dt.datetime) -> List[Dict[str, Any]]:
+        """
+        Stored trips starting within [from_dt, to_dt], ordered by start time. That is the API's
+        own range rule, so a cached run returns the same trips as an uncached one.
+        """
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT data FROM trips WHERE object_id = ? AND start_ts BETWEEN ? AND ? ORDER BY start_ts",
+                (object_id, _epoch(from_dt), _epoch(to_dt)),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_trips(self, object_id: str, from_dt: dt.datetime, to_dt: dt.datetime, fetch: Fetcher) -> List[Dict[str, Any]]:
+        """Trips for [from_dt, to_dt]: uncovered gaps come from fetch(gap_from, gap_to), the rest from disk."""
+        utc = dt.timezone.utc
+        gaps = _gaps(_epoch(from_dt), _epoch(to_dt), self.covered(object_id))
+        incr("trip_cache.hits" if not gaps else "trip_cache.misses")
+        for a, b in gaps:
+            gap_from, gap_to = dt.datetime.fromtimestamp(a, utc), dt.datetime.fromtimestamp(b, utc)
+            with timed("trip_cache.fetch_gap"):
+                trips = fetch(gap_from, gap_to)
+            self.store(object_id, trips, gap_from, gap_to)
+        with timed("trip_cache.read"):
+            return self.read(object_id, from_dt, to_dt)
+
+    def clear(self, object_id: Optional[str] = None) -> None:
+        with self._lock, closing(self._connect()) as conn, conn:
+            if object_id is None:
+                conn.execute("DELETE FROM trips")
+                conn.execute("DELETE FROM coverage")
+            else:
+                conn.execute("DELETE FROM trips WHERE object_id = ?", (object_id,))
+                conn.execute("DELETE FROM coverage WHERE object_id = ?", (object_id,))
+
+
+_default_cache: Optional[TripCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> TripCache:
+    """Process-wide TripCache at DEFAULT_CACHE_PATH."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = TripCache()
+        return _default_cache